@@ -24,9 +24,14 @@ mode_var=${raw_mode_var/-/__}
 mode_var=${mode_var/./__}
 mode_val=${!mode_var}
 
-MAKE="make ${mode_val:+${mode_var}=${mode_val}}"
+raw_engine_var=${MAL_IMPL:-${IMPL}}_ENGINE
+engine_var=${raw_engine_var/-/__}
+engine_var=${engine_var/./__}
+engine_val=${!engine_var}
 
-log_prefix="${ACTION}${REGRESS:+-regress}-${IMPL}${mode_val:+-${mode_val}}${MAL_IMPL:+-${MAL_IMPL}}"
+MAKE="make ${mode_val:+${raw_mode_var}=${mode_val}} ${engine_val:+${raw_engine_var}=${engine_val}}"
+
+log_prefix="${ACTION}${REGRESS:+-regress}-${IMPL}${mode_val:+-${mode_val}}${engine_val:+-${engine_val}}${MAL_IMPL:+-${MAL_IMPL}}"
 TEST_OPTS="${TEST_OPTS} --debug-file ../../${log_prefix}.debug"
 
 # Log everything below this point:
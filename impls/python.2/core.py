@@ -3,9 +3,13 @@ from typing import List, Union, Dict
 
 import reader
 from mal_types import (
+    NIL,
+    TRUE,
+    FALSE,
     MalInt,
     MalNil,
     MalList,
+    MalListView,
     MalBoolean,
     MalExpression,
     MalFunctionCompiled,
@@ -21,13 +25,14 @@ from mal_types import (
     MalSymbol,
     MalNotImplementedException,
     MalIndexError,
+    mal_int,
 )
 
 
 def prn(args: List[MalExpression]) -> MalNil:
     result_string = " ".join(map(lambda x: x.readable_str(), args))
     print(result_string)
-    return MalNil()
+    return NIL
 
 
 def pr_str(args: List[MalExpression]) -> MalString:
@@ -38,26 +43,28 @@ def pr_str(args: List[MalExpression]) -> MalString:
 def println(args: List[MalExpression]) -> MalNil:
     result_string = " ".join(map(lambda x: x.unreadable_str(), args))
     print(result_string)
-    return MalNil()
+    return NIL
 
 
 def list_q(x: MalExpression) -> MalBoolean:
     if isinstance(x, MalList):
-        return MalBoolean(True)
-    return MalBoolean(False)
+        return TRUE
+    return FALSE
 
 
 def empty_q(x: MalExpression) -> MalBoolean:
+    if isinstance(x, MalList) or isinstance(x, MalVector):
+        return TRUE if x.count() == 0 else FALSE
     if sequential_q(x):
-        return MalBoolean(len(x.native()) == 0)
+        return TRUE if len(x.native()) == 0 else FALSE
     raise MalInvalidArgumentException(x, "not a list")
 
 
 def count(x: MalExpression) -> MalInt:
     if isinstance(x, MalList) or isinstance(x, MalVector):
-        return MalInt(len(x.native()))
+        return mal_int(x.count())
     elif isinstance(x, MalNil):
-        return MalInt(0)
+        return mal_int(0)
     raise MalInvalidArgumentException(x, "not a list")
 
 
@@ -68,14 +75,14 @@ def equal(a: MalExpression, b: MalExpression) -> MalBoolean:
         a_native = a.native()
         b_native = b.native()
         if len(a_native) != len(b_native):
-            return MalBoolean(False)
+            return FALSE
         for x in range(0, len(a_native)):
             if not equal(a_native[x], b_native[x]):
-                return MalBoolean(False)
-        return MalBoolean(True)
+                return FALSE
+        return TRUE
     if type(a) == type(b) and a.native() == b.native():
-        return MalBoolean(True)
-    return MalBoolean(False)
+        return TRUE
+    return FALSE
 
 
 def less(a: MalExpression, b: MalExpression) -> MalBoolean:
@@ -83,7 +90,7 @@ def less(a: MalExpression, b: MalExpression) -> MalBoolean:
         raise MalInvalidArgumentException(a, "not an int")
     if not isinstance(b, MalInt):
         raise MalInvalidArgumentException(b, "not an int")
-    return MalBoolean(a.native() < b.native())
+    return TRUE if a.native() < b.native() else FALSE
 
 
 def less_equal(a: MalExpression, b: MalExpression) -> MalBoolean:
@@ -91,7 +98,7 @@ def less_equal(a: MalExpression, b: MalExpression) -> MalBoolean:
         raise MalInvalidArgumentException(a, "not an int")
     if not isinstance(b, MalInt):
         raise MalInvalidArgumentException(b, "not an int")
-    return MalBoolean(a.native() <= b.native())
+    return TRUE if a.native() <= b.native() else FALSE
 
 
 def read_string(a: MalExpression) -> MalExpression:
@@ -133,24 +140,20 @@ def vec(arg: MalExpression) -> MalExpression:
 
 def cons(first: MalExpression, rest: MalExpression) -> MalExpression:
     assert isinstance(rest, MalList) or isinstance(rest, MalVector)
-    return MalList([first] + rest.native())
+    return MalListView.cons(first, rest)
 
 
 def concat(args: List[MalExpression]) -> MalExpression:
-    result_list: List[MalExpression] = []
     for x in args:
         assert isinstance(x, MalList) or isinstance(x, MalVector)
-        result_list = result_list + x.native()
-    return MalList(result_list)
+    return MalListView.concat(args)  # type: ignore
 
 
 def not_(expr: MalExpression) -> MalExpression:
-    if isinstance(expr, MalNil) or (
-        isinstance(expr, MalBoolean) and expr.native() is False
-    ):
-        return MalBoolean(True)
+    if expr is NIL or expr is FALSE:
+        return TRUE
     else:
-        return MalBoolean(False)
+        return FALSE
 
 
 def nth(list_: MalExpression, index: MalExpression) -> MalExpression:
@@ -189,23 +192,23 @@ def throw(exception: MalExpression) -> MalExpression:
 
 
 def nil_q(arg: MalExpression) -> MalExpression:
-    return MalBoolean(isinstance(arg, MalNil))
+    return TRUE if arg is NIL else FALSE
 
 
 def true_q(arg: MalExpression) -> MalExpression:
-    return MalBoolean(isinstance(arg, MalBoolean) and arg.native())
+    return TRUE if arg is TRUE else FALSE
 
 
 def false_q(arg: MalExpression) -> MalExpression:
-    return MalBoolean(isinstance(arg, MalBoolean) and not arg.native())
+    return TRUE if arg is FALSE else FALSE
 
 
 def symbol_q(arg: MalExpression) -> MalExpression:
-    return MalBoolean(isinstance(arg, MalSymbol))
+    return TRUE if isinstance(arg, MalSymbol) else FALSE
 
 
 def keyword_q(arg: MalExpression) -> MalExpression:
-    return MalBoolean(isinstance(arg, MalString) and arg.is_keyword())
+    return TRUE if isinstance(arg, MalString) and arg.is_keyword() else FALSE
 
 
 def keyword(arg: MalExpression) -> MalExpression:
@@ -226,7 +229,7 @@ def readline(arg: MalExpression) -> Union[MalString, MalNil]:
         assert isinstance(arg, MalString)
         line = input(arg.native())
     except EOFError:
-        return MalNil()
+        return NIL
     return MalString(line)
 
 
@@ -236,22 +239,24 @@ def not_implemented(func: str) -> MalExpression:
 
 def get(map: MalExpression, key: MalExpression) -> MalExpression:
     if isinstance(map, MalNil):
-        return MalNil()
+        return NIL
     if not isinstance(map, MalHash_map):
         raise MalInvalidArgumentException(map, "not a hash map")
     if key.native() in map.native():
         return map.native()[key.native()]
     else:
-        return MalNil()
+        return NIL
 
 
 def first(args: List[MalExpression]) -> MalExpression:
     try:
         if isinstance(args[0], MalNil):
-            return MalNil()
+            return NIL
+        if isinstance(args[0], MalList) or isinstance(args[0], MalVector):
+            return args[0].first()
         return args[0].native()[0]
     except IndexError:
-        return MalNil()
+        return NIL
     except TypeError:
         raise MalInvalidArgumentException(args[0], "not a list")
 
@@ -260,21 +265,23 @@ def rest(args: List[MalExpression]) -> MalExpression:
     try:
         if isinstance(args[0], MalNil):
             return MalList([])
+        if isinstance(args[0], MalList) or isinstance(args[0], MalVector):
+            return args[0].rest()
         return MalList(args[0].native()[1:])
     except TypeError:
         raise MalInvalidArgumentException(args[0], "not a list or vector")
 
 
 def vector_q(arg: MalExpression) -> MalExpression:
-    return MalBoolean(isinstance(arg, MalVector))
+    return TRUE if isinstance(arg, MalVector) else FALSE
 
 
 def map_q(arg: MalExpression) -> MalExpression:
-    return MalBoolean(isinstance(arg, MalHash_map))
+    return TRUE if isinstance(arg, MalHash_map) else FALSE
 
 
 def sequential_q(arg: MalExpression) -> MalExpression:
-    return MalBoolean(isinstance(arg, MalList) or isinstance(arg, MalVector))
+    return TRUE if isinstance(arg, MalList) or isinstance(arg, MalVector) else FALSE
 
 
 def vector(args: List[MalExpression]) -> MalExpression:
@@ -292,7 +299,7 @@ def hash_map(args: List[MalExpression]) -> MalExpression:
 
 def assoc(args: List[MalExpression]) -> MalExpression:
     if len(args) == 0:
-        raise MalInvalidArgumentException(MalNil(), "no arguments supplied to assoc")
+        raise MalInvalidArgumentException(NIL, "no arguments supplied to assoc")
     elif len(args) == 1:
         return args[0]
     if not isinstance(args[0], MalHash_map):
@@ -306,18 +313,18 @@ def assoc(args: List[MalExpression]) -> MalExpression:
 
 def contains_q(args: List[MalExpression]) -> MalExpression:
     if len(args) < 2:
-        raise MalInvalidArgumentException(MalNil(), "contains? requires two arguments")
+        raise MalInvalidArgumentException(NIL, "contains? requires two arguments")
     if not isinstance(args[0], MalHash_map):
         raise MalInvalidArgumentException(args[0], "not a hash-map")
     if not isinstance(args[1], MalString):
-        return MalBoolean(False)
-    return MalBoolean(args[1].native() in args[0].native())
+        return FALSE
+    return TRUE if args[1].native() in args[0].native() else FALSE
 
 
 def keys(args: List[MalExpression]) -> MalExpression:
     if len(args) != 1:
         raise MalInvalidArgumentException(
-            MalNil(), "keys requires exactly one argument"
+            NIL, "keys requires exactly one argument"
         )
     if not isinstance(args[0], MalHash_map):
         raise MalInvalidArgumentException(args[0], "not a hash map")
@@ -327,7 +334,7 @@ def keys(args: List[MalExpression]) -> MalExpression:
 def vals(args: List[MalExpression]) -> MalExpression:
     if len(args) != 1:
         raise MalInvalidArgumentException(
-            MalNil(), "vals requires exactly one argument"
+            NIL, "vals requires exactly one argument"
         )
     if not isinstance(args[0], MalHash_map):
         raise MalInvalidArgumentException(args[0], "not a hash map")
@@ -336,7 +343,7 @@ def vals(args: List[MalExpression]) -> MalExpression:
 
 def dissoc(args: List[MalExpression]) -> MalExpression:
     if len(args) == 0:
-        raise MalInvalidArgumentException(MalNil(), "no arguments supplied to dissoc")
+        raise MalInvalidArgumentException(NIL, "no arguments supplied to dissoc")
     elif len(args) == 1:
         return args[0]
     if not isinstance(args[0], MalHash_map):
@@ -361,11 +368,11 @@ def swap(args: List[MalExpression]) -> MalExpression:
 
 
 ns = {
-    "+": MalFunctionCompiled(lambda args: MalInt(args[0].native() + args[1].native())),
-    "-": MalFunctionCompiled(lambda args: MalInt(args[0].native() - args[1].native())),
-    "*": MalFunctionCompiled(lambda args: MalInt(args[0].native() * args[1].native())),
+    "+": MalFunctionCompiled(lambda args: mal_int(args[0].native() + args[1].native())),
+    "-": MalFunctionCompiled(lambda args: mal_int(args[0].native() - args[1].native())),
+    "*": MalFunctionCompiled(lambda args: mal_int(args[0].native() * args[1].native())),
     "/": MalFunctionCompiled(
-        lambda args: MalInt(int(args[0].native() / args[1].native()))
+        lambda args: mal_int(int(args[0].native() / args[1].native()))
     ),
     "prn": MalFunctionCompiled(lambda args: prn(args)),
     "pr-str": MalFunctionCompiled(lambda args: pr_str(args)),
@@ -383,7 +390,9 @@ ns = {
     "slurp": MalFunctionCompiled(lambda args: slurp(args[0])),
     "str": MalFunctionCompiled(lambda args: core_str(args)),
     "atom": MalFunctionCompiled(lambda args: MalAtom(args[0])),
-    "atom?": MalFunctionCompiled(lambda args: MalBoolean(isinstance(args[0], MalAtom))),
+    "atom?": MalFunctionCompiled(
+        lambda args: TRUE if isinstance(args[0], MalAtom) else FALSE
+    ),
     "deref": MalFunctionCompiled(lambda args: deref_q(args[0])),
     "reset!": MalFunctionCompiled(lambda args: reset(args[0], args[1])),
     "vec": MalFunctionCompiled(lambda args: vec(args[0])),
@@ -1,11 +1,25 @@
-from typing import Optional, Dict, List
+from typing import Optional, Dict, List, Set
 
-from mal_types import MalExpression, MalSymbol, MalList, MalUnknownSymbolException
+from mal_types import (
+    MalExpression,
+    MalSymbol,
+    MalList,
+    MalFunctionCompiled,
+    MalFunctionRaw,
+    MalUnknownSymbolException,
+    MalInvalidArgumentException,
+)
 
 
 class Env(object):
     """MAL Environment"""
 
+    # Every name that has been bound to a macro in any environment, and a
+    # stamp that changes whenever a name is added. A name not in the set
+    # cannot be a macro, whatever environment it is looked up in.
+    macro_names: Set[str] = set()
+    macro_version = 0
+
     def __init__(
         self,
         outer: Optional["Env"],
@@ -16,7 +30,9 @@ class Env(object):
         self._data: Dict[str, MalExpression] = {}
         if binds is not None and exprs is not None:
             for x in range(0, len(binds)):
-                assert isinstance(binds[x], MalSymbol)
+                if __debug__:
+                    if not isinstance(binds[x], MalSymbol):
+                        raise MalInvalidArgumentException(binds[x], "not a symbol")
                 if binds[x].native() == "&":
                     self.set(str(binds[x + 1]), MalList(exprs[x:]))
                     break
@@ -24,25 +40,41 @@ class Env(object):
                     self.set(str(binds[x]), exprs[x])
 
     def set(self, key: str, value: MalExpression) -> MalExpression:
+        if (
+            isinstance(value, (MalFunctionCompiled, MalFunctionRaw))
+            and value.is_macro()
+            and key not in Env.macro_names
+        ):
+            Env.macro_names.add(key)
+            Env.macro_version += 1
         self._data[key] = value
         return value
 
     def find(self, key: MalExpression) -> Optional["Env"]:
-        if str(key) in self._data:
-            return self
-        if self._outer is not None:
-            return self._outer.find(key)
+        strkey = str(key)
+        env: Optional[Env] = self
+        while env is not None:
+            if strkey in env._data:
+                return env
+            env = env._outer
+        return None
+
+    def lookup(self, key: str) -> Optional[MalExpression]:
+        """Return the value bound to key, or None if key is unbound"""
+        env: Optional[Env] = self
+        while env is not None:
+            value = env._data.get(key)
+            if value is not None:
+                return value
+            env = env._outer
         return None
 
     def get(self, key: MalExpression) -> MalExpression:
         strkey = str(key)
-        if strkey in self._data:
-            return self._data[strkey]
-
-        location = self.find(key)
-        if location is None:
+        value = self.lookup(strkey)
+        if value is None:
             raise MalUnknownSymbolException(strkey)
-        return location.get(key)
+        return value
 
     def __repr__(self) -> str:
         env_str = "{"
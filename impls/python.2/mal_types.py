@@ -1,7 +1,9 @@
-from typing import Callable, Dict, List, Any
+from typing import Callable, Dict, List, Any, Tuple, Union
 
 
 class MalExpression(object):
+    __slots__ = ()
+
     def __init__(self):
         assert False  # cannot instantiate
 
@@ -24,6 +26,8 @@ class MalExpression(object):
 
 
 class MalString(MalExpression):
+    __slots__ = ("_value",)
+
     def __init__(
         self, input_value: str, is_already_encoded: bool = False, keyword: bool = False
     ) -> None:
@@ -61,24 +65,130 @@ class MalString(MalExpression):
 
 
 class MalList(MalExpression):
+    # macro_free_version is the Env.macro_version at which the head of
+    # the list was last found not to name a macro anywhere (see
+    # is_macro_call in stepA_mal.py)
+    __slots__ = ("_values", "macro_free_version")
+
     def __init__(self, values: List[MalExpression]) -> None:
-        for x in values:
-            assert isinstance(x, MalExpression)
+        if __debug__:
+            for x in values:
+                if not isinstance(x, MalExpression):
+                    raise MalUnknownTypeException("not a mal value: " + repr(x))
         self._values = values
+        self.macro_free_version = -1
 
     def readable_str(self) -> str:
-        return "(" + " ".join(map(lambda x: x.readable_str(), self._values)) + ")"
+        return "(" + " ".join(map(lambda x: x.readable_str(), self.native())) + ")"
 
     def unreadable_str(self) -> str:
-        return "(" + " ".join(map(lambda x: x.unreadable_str(), self._values)) + ")"
+        return "(" + " ".join(map(lambda x: x.unreadable_str(), self.native())) + ")"
 
     def native(self) -> List[MalExpression]:
         return self._values
 
+    def count(self) -> int:
+        return len(self._values)
+
+    def first(self) -> MalExpression:
+        return self._values[0] if self._values else NIL
+
+    def rest(self) -> "MalList":
+        return _rest_of(self._values)
+
+
+# A part of a MalListView: a Python list from some start index on, or
+# a MalListView that has not been joined yet
+_Part = Union[Tuple[List[MalExpression], int], "MalListView"]
+
+
+class MalListView(MalList):
+    """A list made of parts of other lists and vectors.
+
+    rest, cons and concat build these without copying any elements. The
+    parts are joined into a Python list the first time native() is
+    called, in time linear in the length of the list."""
+
+    __slots__ = ("_parts", "_count")
+
+    def __init__(self, parts: Tuple[_Part, ...], count: int) -> None:
+        self._values = None  # type: ignore
+        self._parts = parts
+        self._count = count
+        self.macro_free_version = -1
+
+    @staticmethod
+    def cons(first: MalExpression, rest: "_Seq") -> "MalListView":
+        if rest.count() == 0:
+            return MalListView((([first], 0),), 1)
+        return MalListView((([first], 0), _part(rest)), rest.count() + 1)
+
+    @staticmethod
+    def concat(seqs: List["_Seq"]) -> "MalListView":
+        parts = tuple(_part(seq) for seq in seqs if seq.count() > 0)
+        return MalListView(parts, sum(seq.count() for seq in seqs))
+
+    def native(self) -> List[MalExpression]:
+        if self._values is None:
+            values: List[MalExpression] = []
+            todo = list(reversed(self._parts))
+            while todo:
+                part = todo.pop()
+                if type(part) is tuple:
+                    part_values, start = part
+                    values.extend(part_values[start:] if start else part_values)
+                elif part._values is not None:
+                    values.extend(part._values)
+                else:
+                    todo.extend(reversed(part._parts))
+            self._values = values
+            self._parts = ()
+        return self._values
+
+    def count(self) -> int:
+        return self._count
+
+    def first(self) -> MalExpression:
+        if self._values is not None:
+            return MalList.first(self)
+        if not self._parts:
+            return NIL
+        part = self._parts[0]
+        while type(part) is not tuple:
+            if part._values is not None:
+                return part._values[0]
+            part = part._parts[0]
+        return part[0][part[1]]
+
+    def rest(self) -> MalList:
+        if self._values is None and self._parts and type(self._parts[0]) is tuple:
+            values, start = self._parts[0]
+            rest = self._parts[1:]
+            if start + 1 < len(values):
+                rest = ((values, start + 1),) + rest
+            return MalListView(rest, self._count - 1) if rest else MalList([])
+        return _rest_of(self.native())
+
+
+def _part(seq: "_Seq") -> _Part:
+    if type(seq) is MalListView and seq._values is None:
+        return seq
+    return (seq.native(), 0)
+
+
+def _rest_of(values: List[MalExpression]) -> MalList:
+    if len(values) < 2:
+        return MalList([])
+    return MalListView(((values, 1),), len(values) - 1)
+
 
 class MalSymbol(MalExpression):
+    __slots__ = ("_value",)
+
     def __init__(self, value: str) -> None:
-        assert type(value) is str
+        if __debug__:
+            if type(value) is not str:
+                raise MalUnknownTypeException("not a symbol name: " + repr(value))
 
         self._value = str(value)
 
@@ -94,6 +204,8 @@ class MalSymbol(MalExpression):
 
 
 class MalException(Exception, MalExpression):
+    __slots__ = ("_value",)
+
     def __init__(self, value: MalExpression) -> None:
         self._value = value
 
@@ -105,21 +217,29 @@ class MalException(Exception, MalExpression):
 
 
 class MalIndexError(MalException):
+    __slots__ = ()
+
     def __init__(self, index: int) -> None:
         super().__init__(MalString("Index out of bounds: " + str(index)))
 
 
 class MalSyntaxException(MalException):
+    __slots__ = ()
+
     def __init__(self, message) -> None:
         super().__init__(MalString(message))
 
 
 class MalUnknownTypeException(MalException):
+    __slots__ = ()
+
     def __init__(self, message) -> None:
         super().__init__(MalString(message))
 
 
 class MalInvalidArgumentException(MalException):
+    __slots__ = ()
+
     def __init__(self, arg: MalExpression, reason: str) -> None:
         super().__init__(
             MalString(arg.readable_str() + ": invalid argument: " + reason)
@@ -127,17 +247,23 @@ class MalInvalidArgumentException(MalException):
 
 
 class MalUnknownSymbolException(MalException):
+    __slots__ = ("func",)
+
     def __init__(self, func: str) -> None:
         super().__init__(MalString("'" + func + "' not found"))
         self.func = func
 
 
 class MalNotImplementedException(MalException):
+    __slots__ = ()
+
     def __init__(self, func: str) -> None:
         super().__init__(MalString("not implemented: " + func))
 
 
 class MalFunctionCompiled(MalExpression):
+    __slots__ = ("_native_function", "_is_macro")
+
     def __init__(
         self, native_function: Callable[[List[MalExpression]], MalExpression]
     ) -> None:
@@ -160,8 +286,16 @@ class MalFunctionCompiled(MalExpression):
     def make_macro(self) -> None:
         self._is_macro = True
 
+    def to_macro(self) -> "MalFunctionCompiled":
+        """Return a macro calling the same function, leaving self unchanged"""
+        macro = MalFunctionCompiled(self._native_function)
+        macro.make_macro()
+        return macro
+
 
 class MalFunctionRaw(MalExpression):
+    __slots__ = ("_ast", "_params", "_env", "_native_function", "_is_macro")
+
     def __init__(
         self,
         fn: Callable[[List[MalExpression]], MalExpression],
@@ -199,10 +333,22 @@ class MalFunctionRaw(MalExpression):
     def make_macro(self) -> None:
         self._is_macro = True
 
+    def to_macro(self) -> "MalFunctionRaw":
+        """Return a macro calling the same function, leaving self unchanged"""
+        macro = MalFunctionRaw(
+            self._native_function, self._ast, self._params, self._env
+        )
+        macro.make_macro()
+        return macro
+
 
 class MalInt(MalExpression):
+    __slots__ = ("_value",)
+
     def __init__(self, value: int) -> None:
-        assert type(value) is int
+        if __debug__:
+            if type(value) is not int:
+                raise MalUnknownTypeException("not an int: " + repr(value))
         self._value = value
 
     def readable_str(self) -> str:
@@ -213,6 +359,8 @@ class MalInt(MalExpression):
 
 
 class MalVector(MalExpression):
+    __slots__ = ("_values",)
+
     def __init__(self, values: List[MalExpression]) -> None:
         self._values = values
 
@@ -225,8 +373,22 @@ class MalVector(MalExpression):
     def native(self) -> List[MalExpression]:
         return self._values
 
+    def count(self) -> int:
+        return len(self._values)
+
+    def first(self) -> MalExpression:
+        return self._values[0] if self._values else NIL
+
+    def rest(self) -> MalList:
+        return _rest_of(self._values)
+
+
+_Seq = Union[MalList, MalVector]
+
 
 class MalHash_map(MalExpression):
+    __slots__ = ("_dict",)
+
     def __init__(self, values: Dict[str, MalExpression]) -> None:
         self._dict = values.copy()
 
@@ -249,6 +411,11 @@ class MalHash_map(MalExpression):
 
 
 class MalNil(MalExpression):
+    __slots__ = ()
+
+    def __new__(cls) -> "MalNil":
+        return NIL
+
     def __init__(self) -> None:
         pass
 
@@ -263,8 +430,13 @@ class MalNil(MalExpression):
 
 
 class MalBoolean(MalExpression):
+    __slots__ = ("_value",)
+
+    def __new__(cls, value: bool) -> "MalBoolean":
+        return TRUE if value else FALSE
+
     def __init__(self, value: bool) -> None:
-        self._value = value
+        pass
 
     def readable_str(self) -> str:
         if self._value:
@@ -275,7 +447,27 @@ class MalBoolean(MalExpression):
         return self._value
 
 
+# There is only one nil, true and false: the constructors hand back
+# these instances, so nil and false can be tested for with "is".
+NIL = object.__new__(MalNil)
+TRUE = object.__new__(MalBoolean)
+TRUE._value = True
+FALSE = object.__new__(MalBoolean)
+FALSE._value = False
+
+# Preallocated ints from -5 to 256, the range CPython caches as well
+_small_ints: Dict[int, MalInt] = {i: MalInt(i) for i in range(-5, 257)}
+
+
+def mal_int(value: int) -> MalInt:
+    """Return a MalInt for value, shared if value is a small int"""
+    cached = _small_ints.get(value)
+    return MalInt(value) if cached is None else cached
+
+
 class MalAtom(MalExpression):
+    __slots__ = ("_value",)
+
     def __init__(self, value: MalExpression) -> None:
         self._value = value
 
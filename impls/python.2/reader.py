@@ -1,4 +1,6 @@
-from typing import Dict
+import os
+import re
+from typing import Any, Callable, Dict, List, Tuple
 
 from arpeggio import (  # type: ignore
     ParserPython,
@@ -9,6 +11,9 @@ from arpeggio import (  # type: ignore
 from arpeggio import RegExMatch as _, NoMatch  # type: ignore
 
 from mal_types import (
+    NIL,
+    TRUE,
+    FALSE,
     MalExpression,
     MalInt,
     MalList,
@@ -17,7 +22,7 @@ from mal_types import (
     MalVector,
     MalHash_map,
 )
-from mal_types import MalSymbol, MalString, MalSyntaxException
+from mal_types import MalSymbol, MalString, MalSyntaxException, mal_int
 
 
 # Arpeggio grammar
@@ -96,50 +101,66 @@ def mBoolean():
     return _(r"""(true|false)(?!\?)""")
 
 
+# Node constructors shared by both readers
+def _string(token: str) -> MalString:
+    # token will have quotes, escape sequences
+    assert type(token) is str
+    if token[0] != '"':
+        raise Exception("internal error: parsed a string with no start quote")
+    val: str = token
+    if len(val) < 2 or val[-1] != '"':
+        raise MalSyntaxException("unbalanced string")
+    val = val[1:-1]  # remove outer quotes
+
+    # handle escaped characters
+    i = 0
+    result = ""
+    while i < len(val):
+        if val[i] == "\\":
+            if (i + 1) < len(val):
+                if val[i + 1] == "n":
+                    result += "\n"
+                elif val[i + 1] == "\\":
+                    result += "\\"
+                elif val[i + 1] == '"':
+                    result += '"'
+                i += 2
+            else:
+                raise MalSyntaxException("unbalanced string or invalid escape sequence")
+        else:
+            result += val[i]
+            i += 1
+
+    return MalString(result)
+
+
+def _keyword(token: str) -> MalString:
+    assert type(token) is str
+    assert len(token) > 1
+    return MalString(token[1:], keyword=True)
+
+
+def _hash_map(children: List[MalExpression]) -> MalHash_map:
+    assert len(children) % 2 == 0
+    dict = {}  # type: Dict[MalExpression, MalExpression]
+    for i in range(0, len(children), 2):
+        assert isinstance(children[i], MalString)
+        dict[children[i].native()] = children[i + 1]
+    return MalHash_map(dict)
+
+
 class ReadASTVisitor(PTNodeVisitor):
     def visit_mExpression(self, node, children) -> MalExpression:
         return children[0]  # children should already be Mal types
 
     def visit_mInt(self, node, children) -> MalInt:
-        return MalInt(int(node.value))
+        return mal_int(int(node.value))
 
     def visit_mString(self, node, children) -> MalString:
-        # node.value will have quotes, escape sequences
-        assert type(node.value) is str
-        if node.value[0] != '"':
-            raise Exception("internal error: parsed a string with no start quote")
-        val: str = node.value
-        if len(val) < 2 or val[-1] != '"':
-            raise MalSyntaxException("unbalanced string")
-        val = val[1:-1]  # remove outer quotes
-
-        # handle escaped characters
-        i = 0
-        result = ""
-        while i < len(val):
-            if val[i] == "\\":
-                if (i + 1) < len(val):
-                    if val[i + 1] == "n":
-                        result += "\n"
-                    elif val[i + 1] == "\\":
-                        result += "\\"
-                    elif val[i + 1] == '"':
-                        result += '"'
-                    i += 2
-                else:
-                    raise MalSyntaxException(
-                        "unbalanced string or invalid escape sequence"
-                    )
-            else:
-                result += val[i]
-                i += 1
-
-        return MalString(result)
+        return _string(node.value)
 
     def visit_mKeyword(self, node, children) -> MalString:
-        assert type(node.value) is str
-        assert len(node.value) > 1
-        return MalString(node.value[1:], keyword=True)
+        return _keyword(node.value)
 
     def visit_mList(self, node, children) -> MalList:
         return MalList(children)
@@ -148,12 +169,7 @@ class ReadASTVisitor(PTNodeVisitor):
         return MalVector(children)
 
     def visit_mHash_map(self, node, children):
-        assert len(children) % 2 == 0
-        dict = {}  # type: Dict[MalExpression, MalExpression]
-        for i in range(0, len(children), 2):
-            assert isinstance(children[i], MalString)
-            dict[children[i].native()] = children[i + 1]
-        return MalHash_map(dict)
+        return _hash_map(children)
 
     def visit_mSymbol(self, node, children) -> MalSymbol:
         return MalSymbol(node.value)
@@ -188,14 +204,136 @@ def comment():
     return _(";.*")
 
 
-def read(x: str) -> MalExpression:
-    """Parse a string into a MalExpression"""
-    reader = ParserPython(mExpression, comment_def=comment, ws="\t\n\r ,", debug=False)
+_parser = None
+_visitor = ReadASTVisitor()
+
+
+def read_arpeggio(x: str) -> MalExpression:
+    """Parse a string into a MalExpression with the Arpeggio grammar"""
+    global _parser
+    if _parser is None:  # building the grammar is slow, so only do it once
+        _parser = ParserPython(
+            mExpression, comment_def=comment, ws="\t\n\r ,", debug=False
+        )
 
     try:
-        parsed = visit_parse_tree(reader.parse(x), ReadASTVisitor())
+        parsed = visit_parse_tree(_parser.parse(x), _visitor)
         assert issubclass(type(parsed), MalExpression)
         return parsed
     except NoMatch as e:
         # print(str(e))
         raise MalSyntaxException("invalid syntax or unexpected EOF")
+
+
+# Hand-written recursive descent reader. It accepts the same language as
+# the grammar above, quirks included: only the first form is read, "~"
+# and "@" start a symbol when no form follows them, and a number, nil,
+# true or false is split off the front of a longer token. Errors that
+# the visitor would raise are kept until the read succeeds, since a
+# failing "~" or "@" form is dropped in favour of the symbol.
+_skip = re.compile(r"(?:[\t\n\r ,]|;.*)*").match
+_atom = re.compile(
+    r"""(-?[0123456789]+)"""
+    r"""|("(?:\\.|[^\\"])*"?)"""
+    r"""|(:[^\s\[\]{}('"`,;)]*)"""
+    r"""|(nil(?!\?))"""
+    r"""|(true(?!\?))"""
+    r"""|(false(?!\?))"""
+    r"""|([^\s\[\]{}('"`,;)]+)"""
+).match
+_INT, _STRING, _KEYWORD, _NIL, _TRUE, _FALSE, _SYMBOL = range(1, 8)
+_prefixes = {
+    "'": "quote",
+    "`": "quasiquote",
+    "~@": "splice-unquote",
+    "~": "unquote",
+    "@": "deref",
+}
+_closers = {"(": ")", "[": "]", "{": "}"}
+
+
+class _NoMatch(Exception):
+    pass
+
+
+class _DescentReader(object):
+    def __init__(self, text: str) -> None:
+        self.text = text
+        self.errors: List[Exception] = []
+
+    def form(self, pos: int) -> Tuple[MalExpression, int]:
+        text = self.text
+        pos = _skip(text, pos).end()
+        c = text[pos : pos + 1]
+        if c in _closers:
+            return self.collection(c, pos + 1)
+        if c == "~" or c == "@" or c == "'" or c == "`":
+            for prefix in ("~@", c) if text.startswith("~@", pos) else (c,):
+                mark = len(self.errors)
+                try:
+                    child, end = self.form(pos + len(prefix))
+                    return MalList([MalSymbol(_prefixes[prefix]), child]), end
+                except _NoMatch:
+                    del self.errors[mark:]
+        m = _atom(text, pos)
+        if m is None:
+            raise _NoMatch()
+        kind = m.lastindex
+        token = m.group(kind)
+        if kind == _INT:
+            return mal_int(int(token)), m.end()
+        if kind == _SYMBOL:
+            return MalSymbol(token), m.end()
+        if kind == _NIL:
+            return NIL, m.end()
+        if kind == _TRUE:
+            return TRUE, m.end()
+        if kind == _FALSE:
+            return FALSE, m.end()
+        return self.checked(_string if kind == _STRING else _keyword, token), m.end()
+
+    def collection(self, opener: str, pos: int) -> Tuple[MalExpression, int]:
+        text = self.text
+        closer = _closers[opener]
+        children: List[MalExpression] = []
+        while True:
+            pos = _skip(text, pos).end()
+            if text.startswith(closer, pos):
+                break
+            child, pos = self.form(pos)
+            children.append(child)
+        if opener == "(":
+            return MalList(children), pos + 1
+        if opener == "[":
+            return MalVector(children), pos + 1
+        return self.checked(_hash_map, children), pos + 1
+
+    def checked(self, make: Callable[[Any], MalExpression], arg: Any) -> MalExpression:
+        try:
+            return make(arg)
+        except Exception as e:
+            self.errors.append(e)
+            return NIL
+
+
+def read_descent(x: str) -> MalExpression:
+    """Parse a string into a MalExpression with the hand-written reader"""
+    reader = _DescentReader(x)
+    try:
+        parsed, _end = reader.form(0)
+    except _NoMatch:
+        raise MalSyntaxException("invalid syntax or unexpected EOF")
+    if reader.errors:
+        raise reader.errors[0]
+    return parsed
+
+
+# MAL_READER=arpeggio switches back to the grammar
+read_default = (
+    read_arpeggio if os.environ.get("MAL_READER") == "arpeggio" else read_descent
+)
+
+
+def read(x: str) -> MalExpression:
+    """Parse a string into a MalExpression"""
+    return read_default(x)
@@ -13,8 +13,8 @@ from mal_types import (
 )
 from mal_types import (
     MalList,
-    MalNil,
-    MalBoolean,
+    NIL,
+    FALSE,
     MalFunctionCompiled,
     MalVector,
     MalHash_map,
@@ -76,13 +76,11 @@ def EVAL(ast: MalExpression, env: Env) -> MalExpression:
     if first == "if":
         condition = EVAL(rest[0], env)
 
-        if isinstance(condition, MalNil) or (
-            isinstance(condition, MalBoolean) and condition.native() is False
-        ):
+        if condition is NIL or condition is FALSE:
             if len(rest) >= 3:
                 return EVAL(rest[2], env)
             else:
-                return MalNil()
+                return NIL
         else:
             return EVAL(rest[1], env)
     if first == "fn*":
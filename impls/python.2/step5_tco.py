@@ -7,8 +7,8 @@ from env import Env
 from mal_types import MalExpression, MalSymbol
 from mal_types import (
     MalList,
-    MalNil,
-    MalBoolean,
+    NIL,
+    FALSE,
     MalFunctionCompiled,
     MalFunctionRaw,
     MalVector,
@@ -79,14 +79,12 @@ def EVAL(ast: MalExpression, env: Env) -> MalExpression:
         elif first_str == "if":
             condition = EVAL(ast_native[1], env)
 
-            if isinstance(condition, MalNil) or (
-                isinstance(condition, MalBoolean) and condition.native() is False
-            ):
+            if condition is NIL or condition is FALSE:
                 if len(ast_native) >= 4:
                     ast = ast_native[3]
                     continue
                 else:
-                    return MalNil()
+                    return NIL
             else:
                 ast = ast_native[2]
                 continue
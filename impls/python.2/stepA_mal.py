@@ -11,8 +11,8 @@ from mal_types import (
     MalSymbol,
     MalException,
     MalList,
-    MalNil,
-    MalBoolean,
+    NIL,
+    FALSE,
     MalFunctionCompiled,
     MalFunctionRaw,
     MalVector,
@@ -70,6 +70,37 @@ def quasiquote(ast: MalExpression) -> MalExpression:
         return ast
 
 
+# Checks of special form syntax. They only run in development mode: the
+# run script starts python with -O unless python.2_MODE=checked, which
+# compiles every "if __debug__:" block away.
+def check_let(ast: MalList) -> None:
+    ast_native = ast.native()
+    if len(ast_native) != 3:
+        raise MalInvalidArgumentException(ast, "let* takes bindings and a body")
+    bindings = ast_native[1]
+    if not isinstance(bindings, MalList) and not isinstance(bindings, MalVector):
+        raise MalInvalidArgumentException(bindings, "let* bindings not a list")
+    bindings_list = bindings.native()
+    if len(bindings_list) % 2 != 0:
+        raise MalInvalidArgumentException(bindings, "odd number of let* bindings")
+    for i in range(0, len(bindings_list), 2):
+        if not isinstance(bindings_list[i], MalSymbol):
+            raise MalInvalidArgumentException(bindings_list[i], "not a symbol")
+
+
+def check_catch(catch_block: MalExpression) -> None:
+    if (
+        not isinstance(catch_block, MalList)
+        or len(catch_block.native()) != 3
+        or str(catch_block.native()[0]) != "catch*"
+        or not isinstance(catch_block.native()[0], MalSymbol)
+        or not isinstance(catch_block.native()[1], MalSymbol)
+    ):
+        raise MalInvalidArgumentException(
+            catch_block, "try* takes (catch* symbol expression)"
+        )
+
+
 def EVAL(ast: MalExpression, env: Env) -> MalExpression:
     while True:
         # print("EVAL: " + str(ast))
@@ -90,21 +121,17 @@ def EVAL(ast: MalExpression, env: Env) -> MalExpression:
         if first_str == "defmacro!":
             name = str(ast_native[1])
             value = EVAL(ast_native[2], env)
-            assert isinstance(value, MalFunctionCompiled) or isinstance(
-                value, MalFunctionRaw
-            )
-            value.make_macro()
-            return env.set(name, value)
+            if __debug__:
+                if not isinstance(value, (MalFunctionCompiled, MalFunctionRaw)):
+                    raise MalInvalidArgumentException(value, "not a function")
+            return env.set(name, value.to_macro())
         elif first_str == "let*":
-            assert len(ast_native) == 3
+            if __debug__:
+                check_let(ast)
             let_env = Env(env)
             bindings: MalExpression = ast_native[1]
-            assert isinstance(bindings, MalList) or isinstance(bindings, MalVector)
             bindings_list: List[MalExpression] = bindings.native()
-            assert len(bindings_list) % 2 == 0
             for i in range(0, len(bindings_list), 2):
-                assert isinstance(bindings_list[i], MalSymbol)
-                assert isinstance(bindings_list[i + 1], MalExpression)
                 let_env.set(str(bindings_list[i]), EVAL(bindings_list[i + 1], let_env))
             env = let_env
             ast = ast_native[2]
@@ -117,14 +144,12 @@ def EVAL(ast: MalExpression, env: Env) -> MalExpression:
         elif first_str == "if":
             condition = EVAL(ast_native[1], env)
 
-            if isinstance(condition, MalNil) or (
-                isinstance(condition, MalBoolean) and condition.native() is False
-            ):
+            if condition is NIL or condition is FALSE:
                 if len(ast_native) >= 4:
                     ast = ast_native[3]
                     continue
                 else:
-                    return MalNil()
+                    return NIL
             else:
                 ast = ast_native[2]
                 continue
@@ -156,14 +181,9 @@ def EVAL(ast: MalExpression, env: Env) -> MalExpression:
                 if len(ast_native) < 3:
                     raise e
                 catch_block = ast_native[2]
-                assert (
-                    isinstance(catch_block, MalList)
-                    and isinstance(catch_block.native()[0], MalSymbol)
-                    and str(catch_block.native()[0]) == "catch*"
-                    and len(catch_block.native()) == 3
-                )
+                if __debug__:
+                    check_catch(catch_block)
                 exception_symbol = catch_block.native()[1]
-                assert isinstance(exception_symbol, MalSymbol)
                 env = Env(env)
                 env.set(str(exception_symbol), e.native())
                 ast = catch_block.native()[2]
@@ -197,9 +217,7 @@ def rep(x: str, env: Env) -> str:
 
 def init_repl_env() -> Env:
     def eval_func(args: List[MalExpression], env: Env) -> MalExpression:
-        a0 = args[0]
-        assert isinstance(a0, MalExpression)
-        return EVAL(a0, env)
+        return EVAL(args[0], env)
 
     env = Env(None)
     for key in core.ns:
@@ -225,34 +243,28 @@ def init_repl_env() -> Env:
 
 
 def is_macro_call(ast: MalExpression, env: Env) -> bool:
-    try:
-        x = env.get(ast.native()[0].native())
-        try:
-            assert isinstance(x, MalFunctionRaw) or isinstance(x, MalFunctionCompiled)
-        except AssertionError:
-            return False
-        return x.is_macro()  # type: ignore
-    except TypeError:
-        return False
-    except MalUnknownSymbolException:
-        return False
-    except AttributeError:
-        return False
-    except IndexError:
+    if not isinstance(ast, MalList):
         return False
-    except KeyError:
+    if ast.macro_free_version == Env.macro_version:
         return False
+    ast_native = ast.native()
+    if len(ast_native) > 0 and isinstance(ast_native[0], MalSymbol):
+        name = ast_native[0].native()
+        if name in Env.macro_names:
+            # may be a macro in some environments, so look it up each time
+            x = env.lookup(name)
+            return (
+                isinstance(x, (MalFunctionRaw, MalFunctionCompiled)) and x.is_macro()
+            )
+    ast.macro_free_version = Env.macro_version
+    return False
 
 
 def macroexpand(ast: MalExpression, env: Env) -> MalExpression:
     while True:
         if not is_macro_call(ast, env):
             return ast
-        assert isinstance(ast, MalList)
         macro_func = env.get(ast.native()[0].native())
-        assert isinstance(macro_func, MalFunctionRaw) or isinstance(
-            macro_func, MalFunctionCompiled
-        )
         ast = macro_func.call(ast.native()[1:])
         continue
 
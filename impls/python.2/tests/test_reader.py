@@ -0,0 +1,121 @@
+import glob
+import os
+import random
+import time
+import unittest
+
+import reader
+from mal_types import MalExpression, MalHash_map, MalList, MalVector
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+SOURCES = sorted(
+    glob.glob(os.path.join(HERE, "..", "..", "lib", "*.mal"))
+    + glob.glob(os.path.join(HERE, "..", "..", "mal", "*.mal"))
+)
+TESTS = sorted(glob.glob(os.path.join(HERE, "..", "..", "tests", "*.mal")))
+
+
+def tree(x: MalExpression):
+    """A comparable Python value for the whole of x"""
+    if isinstance(x, (MalList, MalVector)):
+        return type(x).__name__, [tree(y) for y in x.native()]
+    if isinstance(x, MalHash_map):
+        return "MalHash_map", [(k, tree(v)) for k, v in x.native().items()]
+    return type(x).__name__, x.native()
+
+
+def outcome(read, text: str):
+    try:
+        return tree(read(text))
+    except Exception as e:
+        return type(e).__name__, str(e)
+
+
+def program(paths) -> str:
+    return "(do " + "\n".join(open(p).read() for p in paths) + "\nnil)"
+
+
+class TestReader(unittest.TestCase):
+    def assertSameRead(self, text: str) -> None:
+        self.assertEqual(
+            outcome(reader.read_arpeggio, text),
+            outcome(reader.read_descent, text),
+            repr(text),
+        )
+
+    def test_reader_default(self):
+        if os.environ.get("MAL_READER") == "arpeggio":
+            self.assertIs(reader.read_arpeggio, reader.read_default)
+        else:
+            self.assertIs(reader.read_descent, reader.read_default)
+
+    def test_reader_quirks(self):
+        for text in [
+            "",
+            " , ",
+            "1 2",
+            ")",
+            "(1 2",
+            "[1 2)",
+            "~",
+            "~@",
+            "@",
+            "'",
+            "~)",
+            "(~ a)",
+            "~ @a",
+            "'~@a",
+            "(nilx true1 false? nil?)",
+            "(123abc -5a - -)",
+            '"abc',
+            '"a\\qb"',
+            '"a\\',
+            ":",
+            "(:)",
+            "{1 2}",
+            "{:a}",
+            '{"a" 1 "a" 2 :a 3}',
+            '(a"b")',
+            "(a'b a`b a~b a@b)",
+            "(a ; x)\n)",
+            '("a" ; b)',
+            "\f1",
+            '~("abc',
+            '(~("abc)',
+        ]:
+            self.assertSameRead(text)
+
+    def test_reader_test_lines(self):
+        for path in TESTS:
+            with open(path) as f:
+                for line in f:
+                    self.assertSameRead(line)
+
+    def test_reader_sources(self):
+        self.assertSameRead(program(SOURCES))
+
+    def test_reader_random(self):
+        rnd = random.Random(2)
+        tokens = list("()[]{}'`~@^\"\\;:,- \t\n01239anilxtrufes?")
+        tokens += ["nil", "true", "false", "~@", ";c\n", '\\"']
+        for _ in range(3000):
+            self.assertSameRead(
+                "".join(rnd.choice(tokens) for _ in range(rnd.randint(0, 30)))
+            )
+
+    @unittest.skipUnless(os.environ.get("MAL_READER_BENCH"), "MAL_READER_BENCH")
+    def test_reader_throughput(self):
+        text = program(SOURCES * 10)
+        for read in (reader.read_arpeggio, reader.read_descent):
+            read("nil")
+            start = time.perf_counter()
+            read(text)
+            elapsed = time.perf_counter() - start
+            print(
+                "\n%s: %d bytes in %.3fs, %.0f KB/s"
+                % (read.__name__, len(text), elapsed, len(text) / elapsed / 1e3)
+            )
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,5 +1,6 @@
 import unittest
 
+import mal_types
 import stepA_mal
 
 
@@ -62,6 +63,56 @@ class TestStepA(unittest.TestCase):
         )
         self.assertEqual("(1 2 3)", self.rep('(get @e "bar")'))
 
+    def test_shared_scalars(self):
+        env = self._repl_env
+        self.assertIs(mal_types.NIL, stepA_mal.EVAL(stepA_mal.READ("nil"), env))
+        self.assertIs(mal_types.NIL, mal_types.MalNil())
+        self.assertIs(mal_types.TRUE, stepA_mal.EVAL(stepA_mal.READ("(= 1 1)"), env))
+        self.assertIs(mal_types.FALSE, mal_types.MalBoolean(False))
+        self.assertIs(
+            stepA_mal.EVAL(stepA_mal.READ("(+ 100 2)"), env), mal_types.mal_int(102)
+        )
+        self.assertEqual("1000000", self.rep("(* 1000 1000)"))
+        self.assertEqual(
+            "(1 2 2)", self.rep("(list (if 0 1 2) (if nil 1 2) (if false 1 2))")
+        )
+
+    def test_env_lookup(self):
+        self.assertIs(None, self._repl_env.lookup("not-defined"))
+        self.assertIs(stepA_mal.core.ns["+"], self._repl_env.lookup("+"))
+
+    def test_macro_defined_after_call_site(self):
+        self.rep("(def! g (fn* () (later 1)))")
+        self.rep("(def! later (fn* (x) (+ x 1)))")
+        self.assertEqual("2", self.rep("(g)"))
+        self.rep("(defmacro! later (fn* (x) (list '+ x 10)))")
+        self.assertEqual("11", self.rep("(g)"))
+
+    def test_macro_bound_in_closure(self):
+        self.rep("(defmacro! add10 (fn* (x) (list '+ x 10)))")
+        self.rep("(def! mk (fn* (h) (fn* () (h 1))))")
+        self.rep("(def! g1 (mk add10))")
+        self.rep("(def! g2 (mk (fn* (x) (+ x 1))))")
+        self.assertEqual("2", self.rep("(g2)"))
+        self.assertEqual("11", self.rep("(g1)"))
+
+    def test_list_views(self):
+        self.rep("(def! v [1 2 3])")
+        self.rep("(def! l (concat (rest v) (cons 0 v) () (list 4)))")
+        self.assertEqual("(2 3 0 1 2 3 4)", self.rep("l"))
+        self.assertEqual("7", self.rep("(count l)"))
+        self.assertEqual("(0 1 2 3 4)", self.rep("(rest (rest (rest (cons 9 l))))"))
+        self.assertEqual("2", self.rep("(first (concat () (rest [1 2])))"))
+        self.assertEqual("true", self.rep("(empty? (rest (rest (list 1 2))))"))
+        self.assertEqual("[1 2 3]", self.rep("v"))
+        self.assertEqual("[0 1 2 3]", self.rep("(vec (cons 0 v))"))
+
+    def test_defmacro_leaves_function(self):
+        self.rep("(def! f (fn* (x) (list 'quote x)))")
+        self.rep("(defmacro! m f)")
+        self.assertEqual("(quote (+ 1 1))", self.rep("(f '(+ 1 1))"))
+        self.assertEqual("(+ 1 1)", self.rep("(m (+ 1 1))"))
+
 
 if __name__ == "__main__":
     unittest.main()
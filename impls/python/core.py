@@ -1,5 +1,6 @@
-import copy, time
-from itertools import chain
+import time
+from collections import OrderedDict
+from itertools import chain, count as icount, islice, repeat
 
 import mal_types as types
 from mal_types import MalException, List, Vector
@@ -7,36 +8,38 @@ import mal_readline
 import reader
 import printer
 
+_missing = object()
+
 # Errors/Exceptions
 def throw(obj): raise MalException(obj)
 
 
 # String functions
 def pr_str(*args):
-    return " ".join(map(lambda exp: printer._pr_str(exp, True), args))
+    return printer._pr_strs(args, True)
 
 def do_str(*args):
-    return "".join(map(lambda exp: printer._pr_str(exp, False), args))
+    return printer._pr_strs(args, False, "", limited=False)
 
 def prn(*args):
-    print(" ".join(map(lambda exp: printer._pr_str(exp, True), args)))
+    print(printer._pr_strs(args, True))
     return None
 
 def println(*args):
-    print(" ".join(map(lambda exp: printer._pr_str(exp, False), args)))
+    print(printer._pr_strs(args, False))
     return None
 
 
 # Hash map functions
 def assoc(src_hm, *key_vals):
-    hm = copy.copy(src_hm)
-    for i in range(0,len(key_vals),2): hm[key_vals[i]] = key_vals[i+1]
+    hm = src_hm
+    for i in range(0,len(key_vals),2): hm = hm.assoc(key_vals[i], key_vals[i+1])
     return hm
 
 def dissoc(src_hm, *keys):
-    hm = copy.copy(src_hm)
+    hm = src_hm
     for key in keys:
-        hm.pop(key, None)
+        hm = hm.dissoc(key)
     return hm
 
 def get(hm, key):
@@ -55,13 +58,28 @@ def vals(hm): return types._list(*hm.values())
 # Sequence functions
 def coll_Q(coll): return sequential_Q(coll) or hash_map_Q(coll)
 
-def cons(x, seq): return List([x]) + List(seq)
+def cons(x, seq):
+    if types._list_Q(seq) or types._lazy_seq_Q(seq): return seq.cons(x)
+    else:                                              return List(seq).cons(x)
 
-def concat(*lsts): return List(chain(*lsts))
+# the last list is shared as the tail of the result
+def concat(*lsts):
+    if len(lsts) == 0: return List()
+    tail = lsts[-1]
+    if not (types._list_Q(tail) or types._lazy_seq_Q(tail)): tail = List(tail)
+    for x in reversed(list(chain(*lsts[:-1]))): tail = tail.cons(x)
+    return tail
 
+# Walking a lazy sequence, the local reference to its head is dropped
+# so that already visited elements can be freed.
 def nth(lst, idx):
-    if idx < len(lst): return lst[idx]
-    else: throw("nth: index out of range")
+    if types._lazy_seq_Q(lst):
+        if idx < 0: throw("nth: index out of range")
+        it = iter(lst)
+        del lst
+        for x in islice(it, idx, None): return x
+    elif idx < len(lst): return lst[idx]
+    throw("nth: index out of range")
 
 def first(lst):
     if types._nil_Q(lst): return None
@@ -69,24 +87,215 @@ def first(lst):
 
 def rest(lst):
     if types._nil_Q(lst): return List([])
+    elif types._list_Q(lst) or types._lazy_seq_Q(lst): return lst.rest()
     else: return List(lst[1:])
 
-def empty_Q(lst): return len(lst) == 0
+def empty_Q(lst):
+    if types._lazy_seq_Q(lst): return not lst
+    else: return len(lst) == 0
 
 def count(lst):
     if types._nil_Q(lst): return 0
+    elif types._lazy_seq_Q(lst):
+        it = iter(lst)
+        del lst
+        n = 0
+        for _ in it: n += 1
+        return n
     else: return len(lst)
 
-def apply(f, *args): return f(*(list(args[0:-1])+args[-1]))
-
-def mapf(f, lst): return List(map(f, lst))
+def apply(f, *args): return f(*(list(args[0:-1])+list(args[-1])))
+
+# Lazy sequences. These stay lazy when given a lazy sequence and
+# return a list for finite collections, as map always has.
+def _truthy(x): return x is not None and x is not False
+
+def _lazy_or_list(coll, it):
+    if types._lazy_seq_Q(coll): return types._lazy_iter(it)
+    else:                       return List(it)
+
+def mapf(f, lst=_missing):
+    if lst is _missing: return _map_xf(f)
+    if types._nil_Q(lst): return List()
+    return _lazy_or_list(lst, (f(x) for x in lst))
+
+def filterf(f, lst=_missing):
+    if lst is _missing: return _filter_xf(f)
+    if types._nil_Q(lst): return List()
+    return _lazy_or_list(lst, (x for x in lst if _truthy(f(x))))
+
+def take(n, lst=_missing):
+    if lst is _missing: return _take_xf(n)
+    if types._nil_Q(lst): return List()
+    return _lazy_or_list(lst, islice(lst, max(n, 0)))
+
+def drop(n, lst):
+    if types._nil_Q(lst): return List()
+    n = max(n, 0)
+    if types._list_Q(lst): return lst[n:]
+    return _lazy_or_list(lst, islice(lst, n, None))
+
+def partition_all(n, lst=_missing):
+    if lst is _missing: return _partition_all_xf(n)
+    if types._nil_Q(lst): return List()
+    it = iter(lst)
+    chunks = iter(lambda: list(islice(it, n)), [])
+    return _lazy_or_list(lst, (Vector(chunk) for chunk in chunks))
+
+def rangef(*args):
+    if len(args) == 0: return types._lazy_iter(icount())
+    start, end, step = 0, args[0], 1
+    if len(args) > 1: start, end = args[0], args[1]
+    if len(args) > 2: step = args[2]
+    if step == 0: return types._lazy_iter(repeat(start))
+    return types._lazy_iter(islice(icount(start, step),
+                                   max(0, -((start - end) // step))))
+
+def iterate(f, x):
+    def gen(x):
+        while True:
+            yield x
+            x = f(x)
+    return types._lazy_iter(gen(x))
+
+# Reducing and transducers
+#
+# A reducing function takes (acc, x) and returns the next acc, or the
+# acc wrapped by reduced to stop early. A transducer, such as (map f),
+# takes a reducing function and returns another; comp chains them. The
+# reducing functions built here also carry complete(acc), called once
+# at the end to flush any state (partition-all); any other function,
+# a mal fn in particular, completes as the identity. Collections are
+# consumed by iterating over them, maps as [key value] vectors, and no
+# intermediate collection is built.
+def _reducible(coll):
+    if types._nil_Q(coll):        return ()
+    elif types._hash_map_Q(coll): return (Vector((k, v)) for k, v in coll.items())
+    else:                         return coll
+
+def _reduce(rf, acc, it):
+    for x in it:
+        acc = rf(acc, x)
+        if type(acc) is types.Reduced: return acc.val
+    return acc
+
+def _complete(rf, acc):
+    complete = getattr(rf, 'complete', None)
+    return complete(acc) if complete else acc
+
+def _step(rf, step):
+    step.complete = lambda acc: _complete(rf, acc)
+    return step
+
+def _map_xf(f):
+    def xf(rf):
+        return _step(rf, lambda acc, x: rf(acc, f(x)))
+    return xf
+
+def _filter_xf(f):
+    def xf(rf):
+        return _step(rf, lambda acc, x: rf(acc, x) if _truthy(f(x)) else acc)
+    return xf
+
+def _take_xf(n):
+    def xf(rf):
+        left = [n]
+        def step(acc, x):
+            left[0] -= 1
+            if left[0] >= 0: acc = rf(acc, x)
+            if left[0] > 0 or type(acc) is types.Reduced: return acc
+            return types.Reduced(acc)
+        return _step(rf, step)
+    return xf
+
+def _partition_all_xf(n):
+    def xf(rf):
+        buf = []
+        def step(acc, x):
+            buf.append(x)
+            if len(buf) < n: return acc
+            chunk = Vector(buf)
+            del buf[:]
+            return rf(acc, chunk)
+        def complete(acc):
+            if buf:
+                chunk = Vector(buf)
+                del buf[:]
+                acc = rf(acc, chunk)
+                if type(acc) is types.Reduced: acc = acc.val
+            return _complete(rf, acc)
+        step.complete = complete
+        return step
+    return xf
+
+def comp(*fs):
+    if not fs: return lambda x: x
+    last, rest = fs[-1], fs[-2::-1]
+    def composed(*args):
+        x = last(*args)
+        for f in rest: x = f(x)
+        return x
+    return composed
+
+def reduce(f, *args):
+    if len(args) == 1:
+        it = iter(_reducible(args[0]))
+        acc = next(it, _missing)
+        if acc is _missing: return f()
+    else:
+        acc, it = args[0], iter(_reducible(args[1]))
+    del args
+    return _reduce(f, acc, it)
+
+def reduce_kv(f, acc, coll):
+    if types._nil_Q(coll): return acc
+    items = coll.items() if types._hash_map_Q(coll) else enumerate(coll)
+    for k, v in items:
+        acc = f(acc, k, v)
+        if type(acc) is types.Reduced: return acc.val
+    return acc
+
+def _conj_step(coll, x):
+    if types._vector_Q(coll): return coll.conj(x)
+    elif types._hash_map_Q(coll):
+        if types._hash_map_Q(x):
+            for k, v in x.items(): coll = coll.assoc(k, v)
+            return coll
+        return coll.assoc(x[0], x[1])
+    elif types._nil_Q(coll): return List().cons(x)
+    else: return coll.cons(x)
+
+# retains metadata; vectors and maps are filled as transients
+def into(to, *args):
+    xform, coll = args if len(args) == 2 else (None, args[0])
+    editable = types._vector_Q(to) or types._hash_map_Q(to)
+    step = _conj_BANG_step if editable else _conj_step
+    rf = xform(step) if xform else step
+    it = iter(_reducible(coll))
+    del args, coll
+    new_coll = _complete(rf, _reduce(rf, transient(to) if editable else to, it))
+    if editable: new_coll = new_coll.persistent()
+    if hasattr(to, "__meta__") and new_coll is not to:
+        new_coll.__meta__ = to.__meta__
+    return new_coll
+
+def _conj_BANG_step(t, x): return t.conj(x)
+
+def transduce(xform, f, *args):
+    init, coll = args if len(args) == 2 else (f(), args[0])
+    rf = xform(f)
+    it = iter(_reducible(coll))
+    del args, coll
+    return _complete(rf, _reduce(rf, init, it))
 
 # retains metadata
 def conj(lst, *args):
-    if types._list_Q(lst): 
-        new_lst = List(list(reversed(list(args))) + lst)
+    if types._list_Q(lst) or types._lazy_seq_Q(lst):
+        new_lst = lst
+        for x in args: new_lst = new_lst.cons(x)
     else:
-        new_lst = Vector(lst + list(args))
+        new_lst = lst
+        for x in args: new_lst = new_lst.conj(x)
     if hasattr(lst, "__meta__"):
         new_lst.__meta__ = lst.__meta__
     return new_lst
@@ -94,6 +303,8 @@ def conj(lst, *args):
 def seq(obj):
     if types._list_Q(obj):
         return obj if len(obj) > 0 else None
+    elif types._lazy_seq_Q(obj):
+        return obj if obj else None
     elif types._vector_Q(obj):
         return List(obj) if len(obj) > 0 else None
     elif types._string_Q(obj):
@@ -112,6 +323,32 @@ def meta(obj):
     return getattr(obj, "__meta__", None)
 
 
+# Transients (see mal_types)
+def transient(coll):
+    if types._vector_Q(coll):     return types.TransientVector(coll)
+    elif types._hash_map_Q(coll): return types.TransientHashMap(coll)
+    else: throw("transient: not a vector or a map")
+
+def conj_BANG(t, *args):
+    for x in args: t.conj(x)
+    return t
+
+def assoc_BANG(t, *key_vals):
+    for i in range(0, len(key_vals), 2): t.assoc(key_vals[i], key_vals[i+1])
+    return t
+
+def dissoc_BANG(t, *keys):
+    for key in keys: t.dissoc(key)
+    return t
+
+def pop_BANG(t):
+    if type(t) is not types.TransientVector:
+        throw("pop!: not a transient vector")
+    return t.pop()
+
+def persistent_BANG(t): return t.persistent()
+
+
 # Atoms functions
 def deref(atm):    return atm.val
 def reset_BANG(atm,val):
@@ -122,6 +359,63 @@ def swap_BANG(atm,f,*args):
     return atm.val
 
 
+# Memoization
+#
+# Results are kept in a dict keyed on the arguments, compared by value
+# (see mal_types), and on which of them are booleans or floats, so that
+# 1, 1.0 and true stay apart. memoize-lru keeps the n most recently used results
+# (all of them if n is nil), each for at most ttl milliseconds if
+# given. An expired result is only dropped when it is looked up again
+# or falls off the least recently used end, so it counts towards size
+# until then. Stats are [hits, misses, evictions].
+_key_kinds = {bool: 1, float: 2}
+
+def memoize(f):
+    cache, stats = {}, [0, 0, 0]
+    def memo(*args):
+        key = (args, tuple(map(_key_kinds.get, map(type, args))))
+        val = cache.get(key, _missing)
+        if val is _missing:
+            stats[1] += 1
+            val = cache[key] = f(*args)
+        else:
+            stats[0] += 1
+        return val
+    memo.__meta__ = None
+    memo.__memo__ = (cache, stats)
+    return memo
+
+def memoize_lru(n, f, ttl=None):
+    cache, stats = OrderedDict(), [0, 0, 0]
+    def memo(*args):
+        key = (args, tuple(map(_key_kinds.get, map(type, args))))
+        entry = cache.pop(key, None)
+        if entry is not None:
+            if ttl is None or entry[1] > time.time():
+                stats[0] += 1
+                cache[key] = entry
+                return entry[0]
+            stats[2] += 1
+        stats[1] += 1
+        val = f(*args)
+        cache[key] = (val, time.time() + ttl / 1000.0 if ttl else None)
+        while n is not None and len(cache) > n:
+            cache.popitem(last=False)
+            stats[2] += 1
+        return val
+    memo.__meta__ = None
+    memo.__memo__ = (cache, stats)
+    return memo
+
+def memoize_stats(f):
+    if not hasattr(f, '__memo__'): return None
+    cache, stats = f.__memo__
+    return types._hash_map(types._keyword('hits'), stats[0],
+                           types._keyword('misses'), stats[1],
+                           types._keyword('evictions'), stats[2],
+                           types._keyword('size'), len(cache))
+
+
 ns = { 
         '=': types._equal_Q,
         'throw': throw,
@@ -150,9 +444,11 @@ ns = {
         '<=': lambda a,b: a<=b,
         '>':  lambda a,b: a>b,
         '>=': lambda a,b: a>=b,
-        '+':  lambda a,b: a+b,
+        # + and * with no arguments give their identity, as reduce and
+        # transduce without an init call them
+        '+':  lambda a=0,b=0: a+b,
         '-':  lambda a,b: a-b,
-        '*':  lambda a,b: a*b,
+        '*':  lambda a=1,b=1: a*b,
         '/':  lambda a,b: int(a/b),
         'time-ms': lambda : int(time.time() * 1000),
 
@@ -180,15 +476,40 @@ ns = {
         'count': count,
         'apply': apply,
         'map': mapf,
+        'filter': filterf,
+        'take': take,
+        'drop': drop,
+        'range': rangef,
+        'iterate': iterate,
+        'partition-all': partition_all,
+        'lazy-seq*': types._lazy_seq,
 
         'conj': conj,
+        'into': into,
+        'reduce': reduce,
+        'reduce-kv': reduce_kv,
+        'transduce': transduce,
+        'reduced': types._reduced,
+        'reduced?': types._reduced_Q,
+        'comp': comp,
         'seq': seq,
 
         'with-meta': with_meta,
         'meta': meta,
+        'transient': transient,
+        'conj!': conj_BANG,
+        'assoc!': assoc_BANG,
+        'dissoc!': dissoc_BANG,
+        'pop!': pop_BANG,
+        'persistent!': persistent_BANG,
+
         'atom': types._atom,
         'atom?': types._atom_Q,
         'deref': deref,
         'reset!': reset_BANG,
-        'swap!': swap_BANG}
+        'swap!': swap_BANG,
+
+        'memoize': memoize,
+        'memoize-lru': memoize_lru,
+        'memoize-stats': memoize_stats}
 
@@ -1,9 +1,14 @@
 # Environment
 
+# [hits, misses] of the per-site global lookup caches of both engines,
+# reported by global-cache-stats
+global_cache_stats = [0, 0]
+
 class Env():
     def __init__(self, outer=None, binds=None, exprs=None):
         self.data = {}
         self.outer = outer or None
+        self.version = 0
 
         if binds:
             for i in range(len(binds)):
@@ -13,16 +18,76 @@ class Env():
                 else:
                     self.data[binds[i]] = exprs[i]
 
+    # Symbols are interned (see mal_types), so a dict probe for a bound
+    # name usually ends at an identity check
     def find(self, key):
-        if key in self.data: return self
-        elif self.outer:     return self.outer.find(key)
-        else:                return None
+        env = self
+        while env:
+            if key in env.data: return env
+            env = env.outer
+        return None
 
+    # Bumping the version invalidates caches of looked up values
     def set(self, key, value):
         self.data[key] = value
+        self.version += 1
         return value
 
     def get(self, key):
-        env = self.find(key)
-        if not env: raise Exception("'" + key + "' not found")
-        return env.data[key]
+        env = self
+        while env:
+            if key in env.data: return env.data[key]
+            env = env.outer
+        raise Exception("'" + key + "' not found")
+
+# Lexical scopes
+#
+# A Scope is the compile-time shape of a local frame: the names it
+# binds, in slot order. At run time a frame is a plain list whose
+# element 0 is the enclosing frame (or the global Env) and whose
+# element N holds names[N-1], so a local is found by its (depth, slot)
+# address instead of by name.
+
+class Scope():
+    def __init__(self, outer=None, names=(), fn=False):
+        self.outer = outer
+        self.names = list(names)
+        self.fn = fn
+        self.pending = set()
+
+    def define(self, key):
+        if key in self.names: return self.names.index(key) + 1
+        self.names.append(key)
+        return len(self.names)
+
+    # A name not bound yet (being bound, or bound later in the same
+    # let*) is not visible to initializers, except from inside a fn*
+    # (which only runs once the bindings are set).
+    def lookup(self, key):
+        scope, depth, in_fn = self, 0, False
+        while scope:
+            if key in scope.names and (key not in scope.pending or in_fn):
+                return depth, len(scope.names) - scope.names[::-1].index(key)
+            in_fn = in_fn or scope.fn
+            scope, depth = scope.outer, depth + 1
+        return None
+
+    # What is visible from here now, for a form that is only analyzed
+    # when it first runs (see with_snapshot)
+    def snapshot(self):
+        snap, scope = [], self
+        while scope:
+            snap.append((scope, len(scope.names), set(scope.pending)))
+            scope = scope.outer
+        return snap
+
+# Calls f with the scopes of snap hiding again the names that were
+# pending when it was taken or have been defined since
+def with_snapshot(snap, f):
+    saved = [(scope, scope.pending) for scope, _, _ in snap]
+    try:
+        for scope, count, pending in snap:
+            scope.pending = pending | set(scope.names[count:])
+        return f()
+    finally:
+        for scope, pending in saved: scope.pending = pending
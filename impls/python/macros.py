@@ -0,0 +1,38 @@
+import functools
+import mal_types as types
+
+# quasiquote and macro expansion, shared by the closure compiler
+# (stepA_mal) and the bytecode VM (vm)
+def qq_loop(acc, elt):
+    if types._list_Q(elt) and len(elt) == 2 and elt[0] == u'splice-unquote':
+        return types._list(types._symbol(u'concat'), elt[1], acc)
+    else:
+        return types._list(types._symbol(u'cons'), quasiquote(elt), acc)
+
+def qq_foldr(seq):
+    return functools.reduce(qq_loop, reversed(seq), types._list())
+
+def quasiquote(ast):
+    if types._list_Q(ast):
+        if len(ast) == 2 and ast[0] == u'unquote':
+            return ast[1]
+        else:
+            return qq_foldr(ast)
+    elif types._hash_map_Q(ast) or types._symbol_Q(ast):
+        return types._list(types._symbol(u'quote'), ast)
+    elif types._vector_Q (ast):
+        return types._list(types._symbol(u'vec'), qq_foldr(ast))
+    else:
+        return ast
+
+def is_macro_call(ast, env):
+    if not (types._list_Q(ast) and types._symbol_Q(ast[0])):
+        return False
+    found = env.find(ast[0])
+    return found is not None and hasattr(found.data[ast[0]], '_ismacro_')
+
+def macroexpand(ast, env):
+    while is_macro_call(ast, env):
+        mac = env.get(ast[0])
+        ast = mac(*ast[1:])
+    return ast
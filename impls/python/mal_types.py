@@ -1,4 +1,5 @@
 import sys, copy, types as pytypes
+from itertools import islice
 
 # python 3.0 differences
 if sys.hexversion > 0x3000000:
@@ -17,42 +18,75 @@ else:
 # General functions
 
 def _equal_Q(a, b):
+    if a is b: return True
     ota, otb = type(a), type(b)
-    if _string_Q(a) and _string_Q(b):
-        return a == b
-    if not (ota == otb or (_sequential_Q(a) and _sequential_Q(b))):
-        return False;
-    if _symbol_Q(a):
-        return a == b
-    elif _list_Q(a) or _vector_Q(a):
-        if len(a) != len(b): return False
-        for i in range(len(a)):
-            if not _equal_Q(a[i], b[i]): return False
-        return True
-    elif _hash_map_Q(a):
-        akeys = sorted(a.keys())
-        bkeys = sorted(b.keys())
-        if len(akeys) != len(bkeys): return False
-        for i in range(len(akeys)):
-            if akeys[i] != bkeys[i]: return False
-            if not _equal_Q(a[akeys[i]], b[bkeys[i]]): return False
+    if ota in _seq_types:
+        if otb not in _seq_types: return False
+        if _hashes_differ(a, b): return False
+        # a lazy seq may be infinite: walk it rather than count it
+        if ota is not LazySeq and otb is not LazySeq and len(a) != len(b):
+            return False
+        ib = iter(b)
+        for x in a:
+            y = next(ib, _MISSING)
+            if y is _MISSING or not (x is y or _equal_Q(x, y)): return False
+        return next(ib, _MISSING) is _MISSING
+    elif ota is Hash_Map:
+        if otb is not Hash_Map: return False
+        if _hashes_differ(a, b) or len(a) != len(b): return False
+        same = _nodes_equal(a._root, b._root)
+        if same is not None: return same
+        get = b._root.get
+        for k, v, _ in a._root.items():
+            w = get(_hash32(k), 0, k, _MISSING)
+            if w is _MISSING or not (v is w or _equal_Q(v, w)): return False
         return True
+    elif ota is not otb:
+        return ota in str_types and otb in str_types and a == b
     else:
         return a == b
 
-def _sequential_Q(seq): return _list_Q(seq) or _vector_Q(seq)
+# Collections hash by value, so that any mal value can be a hash-map
+# key: equal sequences hash alike whatever their type, and a map hashes
+# the set of its entries. The hash is computed on first use and kept in
+# the _hash slot; two collections whose hashes are both known and
+# differ are not equal.
+def _seq_hash(seq):
+    try:
+        return seq._hash
+    except AttributeError:
+        seq._hash = h = hash(tuple(seq))
+        return h
+
+def _map_hash(hm):
+    try:
+        return hm._hash
+    except AttributeError:
+        hm._hash = h = hash(frozenset((k, v) for k, v, _ in hm._root.items()))
+        return h
 
+def _hashes_differ(a, b):
+    ha = getattr(a, '_hash', None)
+    if ha is None: return False
+    hb = getattr(b, '_hash', None)
+    return hb is not None and ha != hb
+
+def _sequential_Q(seq): return type(seq) in _seq_types
+
+# A memoized function's copy shares its cache and stats (see core)
 def _clone(obj):
     #if type(obj) == type(lambda x:x):
     if type(obj) == pytypes.FunctionType:
         if obj.__code__:
-            return pytypes.FunctionType(
+            fn = pytypes.FunctionType(
                     obj.__code__, obj.__globals__, name = obj.__name__,
                     argdefs = obj.__defaults__, closure = obj.__closure__)
         else:
-            return pytypes.FunctionType(
+            fn = pytypes.FunctionType(
                     obj.func_code, obj.func_globals, name = obj.func_name,
                     argdefs = obj.func_defaults, closure = obj.func_closure)
+        if hasattr(obj, '__memo__'): fn.__memo__ = obj.__memo__
+        return fn
     else:
         return copy.copy(obj)
 
@@ -68,28 +102,35 @@ class MalException(Exception):
 def _nil_Q(exp):    return exp is None
 def _true_Q(exp):   return exp is True
 def _false_Q(exp):  return exp is False
-def _string_Q(exp):
-    if type(exp) in str_types:
-        return len(exp) == 0 or exp[0] != _u("\u029e")
-    else:
-        return False
+def _string_Q(exp): return type(exp) in str_types
 def _number_Q(exp): return type(exp) == int
 
 # Symbols
+# Interned: reading or building the same name twice gives the same
+# Symbol, so env lookups of a name usually stop at the identity check.
 class Symbol(str): pass
-def _symbol(str): return Symbol(str)
+_symbols = {}
+def _symbol(name):
+    sym = _symbols.get(name)
+    if sym is None: sym = _symbols[name] = Symbol(name)
+    return sym
 def _symbol_Q(exp): return type(exp) == Symbol
 
 # Keywords
-# A specially prefixed string
-def _keyword(str):
-    if str[0] == _u("\u029e"): return str
-    else:                      return _u("\u029e") + str
-def _keyword_Q(exp):
-    if type(exp) in str_types:
-        return len(exp) != 0 and exp[0] == _u("\u029e")
-    else:
-        return False
+# Interned as well: there is one Keyword per name, and keywords compare
+# and hash by identity.
+class Keyword(object):
+    __slots__ = ('name',)
+    def __init__(self, name): self.name = name
+    def __str__(self): return ':' + self.name
+    def __copy__(self): return self
+_keywords = {}
+def _keyword(name):
+    if type(name) is Keyword: return name
+    kw = _keywords.get(name)
+    if kw is None: kw = _keywords[name] = Keyword(name)
+    return kw
+def _keyword_Q(exp): return type(exp) is Keyword
 
 # Functions
 def _function(Eval, Env, ast, env, params):
@@ -103,36 +144,807 @@ def _function_Q(f):
     return callable(f)
 
 # lists
-class List(list):
-    def __add__(self, rhs): return List(list.__add__(self, rhs))
+#
+# An immutable singly linked list. Each cell knows its element count,
+# so cons, first, rest and count are O(1) and rest shares the tail.
+class List(object):
+    __slots__ = ('_first', '_rest', '_cnt', '_hash', '__meta__')
+    __hash__ = _seq_hash
+    def __eq__(self, other): return _equal_Q(self, other)
+    def __ne__(self, other): return not _equal_Q(self, other)
+    def __init__(self, vals=()):
+        if type(vals) == List:
+            self._first, self._rest, self._cnt = vals._first, vals._rest, vals._cnt
+            return
+        tail = _empty_list()
+        for val in reversed(list(vals)): tail = tail.cons(val)
+        self._first, self._rest, self._cnt = tail._first, tail._rest, tail._cnt
+
+    def _new(self, first, rest, cnt):
+        lst = List.__new__(List)
+        lst._first, lst._rest, lst._cnt = first, rest, cnt
+        return lst
+
+    def cons(self, val): return self._new(val, self, self._cnt + 1)
+    def first(self): return self._first
+    def rest(self):
+        if self._cnt == 0: return _empty_list()
+        return self._rest
+
+    def __len__(self): return self._cnt
+
+    def __iter__(self):
+        node = self
+        while node._cnt:
+            yield node._first
+            node = node._rest
+
+    def __reversed__(self): return reversed(list(self))
+
     def __getitem__(self, i):
-        if type(i) == slice: return List(list.__getitem__(self, i))
-        elif i >= len(self): return None
-        else:                return list.__getitem__(self, i)
-    def __getslice__(self, *a): return List(list.__getslice__(self, *a))
+        if type(i) == slice:
+            if i.stop is None and i.step is None and (i.start or 0) >= 0:
+                return self._drop(i.start or 0)
+            return List(list(self)[i])
+        if i < 0: i += self._cnt
+        if i >= self._cnt or i < 0: return None
+        return self._drop(i)._first
+
+    def _drop(self, n):
+        node = self
+        while n > 0 and node._cnt:
+            node, n = node._rest, n - 1
+        return node
+
+    def __add__(self, rhs):
+        tail = rhs if type(rhs) == List else List(rhs)
+        for val in reversed(list(self)): tail = tail.cons(val)
+        return tail
+
+    def __copy__(self):
+        lst = self._new(self._first, self._rest, self._cnt)
+        if hasattr(self, '__meta__'): lst.__meta__ = self.__meta__
+        return lst
+def _empty_list():
+    lst = List.__new__(List)
+    lst._first, lst._rest, lst._cnt = None, None, 0
+    return lst
 def _list(*vals): return List(vals)
 def _list_Q(exp):   return type(exp) == List
 
 
 # vectors
-class Vector(list):
-    def __add__(self, rhs): return Vector(list.__add__(self, rhs))
+#
+# A persistent bit-partitioned vector: a trie of 32-element arrays
+# holding all but the last 1..32 elements, which live in a tail array.
+# conj only touches the tail until it fills up and is pushed into the
+# trie; nth and assoc walk log32(n) levels. A tail may be shared by
+# several versions, each using only its first cnt - tailoff entries, so
+# conj onto the newest version appends in place.
+
+def _new_path(level, node):
+    while level > 0:
+        node, level = [node], level - 5
+    return node
+
+class Vector(object):
+    __slots__ = ('_cnt', '_shift', '_root', '_tail', '_hash', '__meta__')
+    __hash__ = _seq_hash
+    def __eq__(self, other): return _equal_Q(self, other)
+    def __ne__(self, other): return not _equal_Q(self, other)
+    def __init__(self, vals=()):
+        vals = list(vals)
+        cnt = len(vals)
+        tailoff = ((cnt - 1) >> 5) << 5 if cnt > 32 else 0
+        level, shift = [vals[i:i+32] for i in range(0, tailoff, 32)], 5
+        while len(level) > 32:
+            level = [level[i:i+32] for i in range(0, len(level), 32)]
+            shift += 5
+        self._cnt, self._shift = cnt, shift
+        self._root, self._tail = level, vals[tailoff:]
+
+    def _new(self, cnt, shift, root, tail):
+        vec = Vector.__new__(Vector)
+        vec._cnt, vec._shift, vec._root, vec._tail = cnt, shift, root, tail
+        if hasattr(self, '__meta__'): vec.__meta__ = self.__meta__
+        return vec
+
+    def _tailoff(self):
+        if self._cnt <= 32: return 0
+        return ((self._cnt - 1) >> 5) << 5
+
+    def _leaf_for(self, i):
+        node = self._root
+        for level in range(self._shift, 0, -5):
+            node = node[(i >> level) & 31]
+        return node
+
+    def _push_tail(self, level, parent, tail):
+        idx = ((self._cnt - 1) >> level) & 31
+        node = parent[:]
+        if level == 5:
+            child = tail
+        elif idx < len(parent):
+            child = self._push_tail(level - 5, parent[idx], tail)
+        else:
+            child = _new_path(level - 5, tail)
+        if idx < len(node): node[idx] = child
+        else:               node.append(child)
+        return node
+
+    def _assoc_in(self, level, node, i, val):
+        node = node[:]
+        if level == 0:
+            node[i & 31] = val
+        else:
+            idx = (i >> level) & 31
+            node[idx] = self._assoc_in(level - 5, node[idx], i, val)
+        return node
+
+    def nth(self, i):
+        if i >= self._tailoff(): return self._tail[i & 31]
+        return self._leaf_for(i)[i & 31]
+
+    def get(self, i, default=None):
+        if type(i) is int and 0 <= i < self._cnt: return self.nth(i)
+        return default
+
+    def conj(self, val):
+        cnt, tailoff = self._cnt, self._tailoff()
+        used = cnt - tailoff
+        if used < 32:
+            tail = self._tail
+            if len(tail) == used: tail.append(val)
+            else:                 tail = tail[:used] + [val]
+            return self._new(cnt + 1, self._shift, self._root, tail)
+        shift = self._shift
+        if (cnt >> 5) > (1 << shift):
+            root = [self._root, _new_path(shift, self._tail)]
+            shift += 5
+        else:
+            root = self._push_tail(shift, self._root, self._tail)
+        return self._new(cnt + 1, shift, root, [val])
+
+    def assoc(self, i, val):
+        cnt, tailoff = self._cnt, self._tailoff()
+        if i == cnt: return self.conj(val)
+        if i >= tailoff:
+            tail = self._tail[:cnt - tailoff]
+            tail[i - tailoff] = val
+            return self._new(cnt, self._shift, self._root, tail)
+        root = self._assoc_in(self._shift, self._root, i, val)
+        return self._new(cnt, self._shift, root, self._tail)
+
+    def __len__(self): return self._cnt
+
+    def __iter__(self):
+        tailoff = self._tailoff()
+        for i in range(0, tailoff, 32):
+            for val in self._leaf_for(i): yield val
+        for val in self._tail[:self._cnt - tailoff]: yield val
+
     def __getitem__(self, i):
-        if type(i) == slice: return Vector(list.__getitem__(self, i))
-        elif i >= len(self): return None
-        else:                return list.__getitem__(self, i)
-    def __getslice__(self, *a): return Vector(list.__getslice__(self, *a))
+        if type(i) == slice: return Vector(list(self)[i])
+        if i < 0: i += self._cnt
+        if i >= self._cnt or i < 0: return None
+        else:                       return self.nth(i)
+
+    def __copy__(self):
+        return self._new(self._cnt, self._shift, self._root, self._tail)
 def _vector(*vals): return Vector(vals)
 def _vector_Q(exp): return type(exp) == Vector
 
 # Hash maps
-class Hash_Map(dict): pass
+#
+# A persistent hash array mapped trie. Each node has a bitmap of the
+# 5-bit hash fragments in use at its level and a compact array with one
+# entry per set bit: either a (key, value, seq) entry or a child node.
+# Keys whose 32-bit hashes are equal share a collision node. assoc and
+# dissoc copy only the path from the root to the entry they change.
+# seq numbers the keys in the order they were added, and a map lists
+# its entries in that order, as the dict it replaced did; assoc of a
+# key already there keeps its seq.
+
+_MISSING = object()
+
+def _hash32(key): return hash(key) & 0xffffffff
+
+# int.bit_count is Python 3.10+
+_popcount = getattr(int, 'bit_count', None) or (lambda n: bin(n).count('1'))
+
+def _pair_node(shift, e1, h1, e2, h2):
+    if h1 == h2: return _CollisionNode(h1, [e1, e2])
+    b1, b2 = (h1 >> shift) & 31, (h2 >> shift) & 31
+    if b1 == b2:
+        return _BitmapNode(1 << b1, [_pair_node(shift + 5, e1, h1, e2, h2)])
+    elif b1 < b2:
+        return _BitmapNode((1 << b1) | (1 << b2), [e1, e2])
+    else:
+        return _BitmapNode((1 << b1) | (1 << b2), [e2, e1])
+
+class _BitmapNode(object):
+    __slots__ = ('bitmap', 'array')
+    def __init__(self, bitmap, array):
+        self.bitmap, self.array = bitmap, array
+
+    def get(self, h, shift, key, default):
+        bit = 1 << ((h >> shift) & 31)
+        if not self.bitmap & bit: return default
+        entry = self.array[_popcount(self.bitmap & (bit - 1))]
+        if type(entry) is tuple:
+            k = entry[0]
+            if k is key or k == key: return entry[1]
+            return default
+        return entry.get(h, shift + 5, key, default)
+
+    # Returns self when nothing changed; sets added[0] for a new key,
+    # which gets seq
+    def assoc(self, h, shift, key, val, seq, added):
+        bit = 1 << ((h >> shift) & 31)
+        idx = _popcount(self.bitmap & (bit - 1))
+        if not self.bitmap & bit:
+            added[0] = True
+            array = self.array[:]
+            array.insert(idx, (key, val, seq))
+            return _BitmapNode(self.bitmap | bit, array)
+        entry = self.array[idx]
+        if type(entry) is tuple:
+            k = entry[0]
+            if k is key or k == key:
+                if entry[1] is val: return self
+                new = (key, val, entry[2])
+            else:
+                added[0] = True
+                new = _pair_node(shift + 5, entry, _hash32(k), (key, val, seq), h)
+        else:
+            new = entry.assoc(h, shift + 5, key, val, seq, added)
+            if new is entry: return self
+        array = self.array[:]
+        array[idx] = new
+        return _BitmapNode(self.bitmap, array)
+
+    # Returns self when key is absent, None when the node becomes empty
+    def dissoc(self, h, shift, key):
+        bit = 1 << ((h >> shift) & 31)
+        if not self.bitmap & bit: return self
+        idx = _popcount(self.bitmap & (bit - 1))
+        entry = self.array[idx]
+        if type(entry) is tuple:
+            k = entry[0]
+            if not (k is key or k == key): return self
+            new = None
+        else:
+            new = entry.dissoc(h, shift + 5, key)
+            if new is entry: return self
+        array = self.array[:]
+        if new is None:
+            if self.bitmap == bit: return None
+            del array[idx]
+            return _BitmapNode(self.bitmap ^ bit, array)
+        if len(new.array) == 1 and type(new.array[0]) is tuple:
+            new = new.array[0]
+        array[idx] = new
+        return _BitmapNode(self.bitmap, array)
+
+    # In-place variants for transients (see TransientHashMap): a node
+    # not in owned is copied first. dissoc_t sets removed[0] when it
+    # removes key.
+    def _editable(self, owned):
+        if id(self) in owned: return self
+        node = _BitmapNode(self.bitmap, self.array[:])
+        owned.add(id(node))
+        return node
+
+    # walks down in a loop, copying the nodes on the path not owned yet
+    def assoc_t(self, h, shift, key, val, seq, added, owned):
+        top = node = self if id(self) in owned else self._editable(owned)
+        while True:
+            bit = 1 << ((h >> shift) & 31)
+            idx = _popcount(node.bitmap & (bit - 1))
+            if not node.bitmap & bit:
+                added[0] = True
+                node.array.insert(idx, (key, val, seq))
+                node.bitmap |= bit
+                return top
+            entry = node.array[idx]
+            if type(entry) is tuple:
+                k = entry[0]
+                if k is key or k == key:
+                    if entry[1] is not val: node.array[idx] = (key, val, entry[2])
+                else:
+                    added[0] = True
+                    node.array[idx] = _pair_node(shift + 5, entry, _hash32(k), (key, val, seq), h)
+                return top
+            if type(entry) is _CollisionNode:
+                node.array[idx] = entry.assoc_t(h, shift + 5, key, val, seq, added, owned)
+                return top
+            if id(entry) not in owned: entry = node.array[idx] = entry._editable(owned)
+            node, shift = entry, shift + 5
+
+    def dissoc_t(self, h, shift, key, removed, owned):
+        bit = 1 << ((h >> shift) & 31)
+        if not self.bitmap & bit: return self
+        idx = _popcount(self.bitmap & (bit - 1))
+        entry = self.array[idx]
+        if type(entry) is tuple:
+            k = entry[0]
+            if not (k is key or k == key): return self
+            removed[0] = True
+            new = None
+        else:
+            new = entry.dissoc_t(h, shift + 5, key, removed, owned)
+            if not removed[0]: return self
+            if new is not None and len(new.array) == 1 and type(new.array[0]) is tuple:
+                new = new.array[0]
+            if new is entry: return self
+        node = self._editable(owned)
+        if new is None:
+            if node.bitmap == bit: return None
+            del node.array[idx]
+            node.bitmap ^= bit
+        else:
+            node.array[idx] = new
+        return node
+
+    def items(self):
+        for entry in self.array:
+            if type(entry) is tuple:
+                yield entry
+            else:
+                for item in entry.items(): yield item
+
+class _CollisionNode(object):
+    __slots__ = ('hash', 'array')
+    def __init__(self, hash, array):
+        self.hash, self.array = hash, array
+
+    def _find(self, key):
+        for i, entry in enumerate(self.array):
+            k = entry[0]
+            if k is key or k == key: return i
+        return -1
+
+    def get(self, h, shift, key, default):
+        i = self._find(key) if h == self.hash else -1
+        if i < 0: return default
+        return self.array[i][1]
+
+    def assoc(self, h, shift, key, val, seq, added):
+        if h != self.hash:
+            node = _BitmapNode(1 << ((self.hash >> shift) & 31), [self])
+            return node.assoc(h, shift, key, val, seq, added)
+        i = self._find(key)
+        array = self.array[:]
+        if i < 0:
+            added[0] = True
+            array.append((key, val, seq))
+        elif array[i][1] is val:
+            return self
+        else:
+            array[i] = (key, val, array[i][2])
+        return _CollisionNode(h, array)
+
+    def dissoc(self, h, shift, key):
+        i = self._find(key) if h == self.hash else -1
+        if i < 0: return self
+        if len(self.array) == 1: return None
+        array = self.array[:]
+        del array[i]
+        return _CollisionNode(h, array)
+
+    def _editable(self, owned):
+        if id(self) in owned: return self
+        node = _CollisionNode(self.hash, self.array[:])
+        owned.add(id(node))
+        return node
+
+    def assoc_t(self, h, shift, key, val, seq, added, owned):
+        if h != self.hash:
+            node = _BitmapNode(1 << ((self.hash >> shift) & 31), [self])
+            owned.add(id(node))
+            return node.assoc_t(h, shift, key, val, seq, added, owned)
+        node = self._editable(owned)
+        i = node._find(key)
+        if i < 0:
+            added[0] = True
+            node.array.append((key, val, seq))
+        else:
+            node.array[i] = (key, val, node.array[i][2])
+        return node
+
+    def dissoc_t(self, h, shift, key, removed, owned):
+        i = self._find(key) if h == self.hash else -1
+        if i < 0: return self
+        removed[0] = True
+        if len(self.array) == 1: return None
+        node = self._editable(owned)
+        del node.array[i]
+        return node
+
+    def items(self):
+        return iter(self.array)
+
+_EMPTY_NODE = _BitmapNode(0, [])
+
+# the (key, value) pairs of a trie in the order they were added
+def _ordered_items(root):
+    return [(k, v) for k, v, seq in sorted(root.items(), key=_seq_of)]
+def _seq_of(entry): return entry[2]
+
+# Walks two tries of maps of the same size side by side, skipping the
+# subtrees they share. An entry of one that is not at the same place in
+# the other is not in it at all, as lookups take the same path; returns
+# None if the shapes differ in a way that does not tell (an entry in
+# one where the other has a subtree).
+def _nodes_equal(x, y):
+    if x is y: return True
+    tx, ty = type(x), type(y)
+    if tx is _CollisionNode and ty is _CollisionNode:
+        if x.hash != y.hash or len(x.array) != len(y.array): return False
+        for k, v, _ in x.array:
+            i = y._find(k)
+            if i < 0: return False
+            w = y.array[i][1]
+            if not (v is w or _equal_Q(v, w)): return False
+        return True
+    if tx is not _BitmapNode or ty is not _BitmapNode: return None
+    if x.bitmap != y.bitmap: return False
+    for ex, ey in zip(x.array, y.array):
+        if ex is ey: continue
+        if type(ex) is tuple:
+            if type(ey) is not tuple: return None
+            if not (ex[0] is ey[0] or ex[0] == ey[0]): return False
+            if not (ex[1] is ey[1] or _equal_Q(ex[1], ey[1])): return False
+        elif type(ey) is tuple:
+            return None
+        else:
+            same = _nodes_equal(ex, ey)
+            if same is not True: return same
+    return True
+
+class Hash_Map(object):
+    __slots__ = ('_root', '_count', '_next', '_hash', '__meta__')
+    __hash__ = _map_hash
+    def __eq__(self, other): return _equal_Q(self, other)
+    def __ne__(self, other): return not _equal_Q(self, other)
+    # built in place, as a transient would
+    def __init__(self, items=()):
+        if hasattr(items, 'items'): items = items.items()
+        root, count, added, owned = _EMPTY_NODE, 0, [False], set()
+        for k, v in items:
+            added[0] = False
+            root = root.assoc_t(_hash32(k), 0, k, v, count, added, owned)
+            if added[0]: count += 1
+        self._root, self._count, self._next = root, count, count
+
+    def _new(self, root, count, next):
+        hm = Hash_Map.__new__(Hash_Map)
+        hm._root, hm._count, hm._next = root, count, next
+        if hasattr(self, '__meta__'): hm.__meta__ = self.__meta__
+        return hm
+
+    def assoc(self, key, val):
+        added = [False]
+        root = self._root.assoc(_hash32(key), 0, key, val, self._next, added)
+        if root is self._root: return self
+        return self._new(root, self._count + added[0], self._next + added[0])
+
+    def dissoc(self, key):
+        root = self._root.dissoc(_hash32(key), 0, key)
+        if root is self._root: return self
+        return self._new(root or _EMPTY_NODE, self._count - 1, self._next)
+
+    def get(self, key, default=None):
+        return self._root.get(_hash32(key), 0, key, default)
+
+    def __getitem__(self, key):
+        val = self._root.get(_hash32(key), 0, key, _MISSING)
+        if val is _MISSING: raise KeyError(key)
+        return val
+
+    def __contains__(self, key):
+        return self._root.get(_hash32(key), 0, key, _MISSING) is not _MISSING
+
+    def __len__(self): return self._count
+    def __iter__(self): return iter(self.keys())
+    def keys(self): return [k for k, v in _ordered_items(self._root)]
+    def values(self): return [v for k, v in _ordered_items(self._root)]
+    def items(self): return _ordered_items(self._root)
+    def __copy__(self): return self._new(self._root, self._count, self._next)
+
 def _hash_map(*key_vals):
-    hm = Hash_Map()
-    for i in range(0,len(key_vals),2): hm[key_vals[i]] = key_vals[i+1]
-    return hm
+    return Hash_Map(zip(key_vals[0::2], key_vals[1::2]))
 def _hash_map_Q(exp): return type(exp) == Hash_Map
 
+# Transients
+#
+# A transient vector or map is updated in place by its single owner and
+# frozen by persistent! in O(1). It starts out sharing every node of the
+# persistent collection it was made from. The first update of a node
+# copies it and records the copy's id in owned; later updates change
+# owned nodes directly. persistent! hands the nodes to a new persistent
+# collection and retires the transient, so a node is never changed
+# after it has been frozen.
+def _retired(name):
+    raise MalException(name + ": transient used after persistent!")
+
+class TransientVector(object):
+    __slots__ = ('_cnt', '_shift', '_root', '_tail', '_owned')
+    def __init__(self, vec):
+        self._cnt, self._shift, self._root = vec._cnt, vec._shift, vec._root
+        self._tail = vec._tail[:vec._cnt - vec._tailoff()]
+        self._owned = set()
+
+    def _tailoff(self):
+        if self._cnt <= 32: return 0
+        return ((self._cnt - 1) >> 5) << 5
+
+    def _own(self, node):
+        if id(node) in self._owned: return node
+        node = node[:]
+        self._owned.add(id(node))
+        return node
+
+    def _leaf_for(self, i):
+        node = self._root
+        for level in range(self._shift, 0, -5):
+            node = node[(i >> level) & 31]
+        return node
+
+    def _push_tail(self, level, parent, tail):
+        idx = ((self._cnt - 1) >> level) & 31
+        node = self._own(parent)
+        if level == 5:
+            child = tail
+        elif idx < len(node):
+            child = self._push_tail(level - 5, node[idx], tail)
+        else:
+            child = _new_path(level - 5, tail)
+        if idx < len(node): node[idx] = child
+        else:               node.append(child)
+        return node
+
+    def _pop_tail(self, level, node):
+        idx = ((self._cnt - 2) >> level) & 31
+        if level > 5:
+            child = self._pop_tail(level - 5, node[idx])
+            if child is None and idx == 0: return None
+            node = self._own(node)
+            if child is None: node.pop()
+            else:             node[idx] = child
+            return node
+        elif idx == 0:
+            return None
+        node = self._own(node)
+        node.pop()
+        return node
+
+    def conj(self, val):
+        if self._owned is None: _retired("conj!")
+        cnt = self._cnt
+        if cnt - self._tailoff() < 32:
+            self._tail.append(val)
+        else:
+            tail, shift = self._tail, self._shift
+            self._owned.add(id(tail))
+            if (cnt >> 5) > (1 << shift):
+                self._root = [self._root, _new_path(shift, tail)]
+                self._owned.add(id(self._root))
+                self._shift = shift + 5
+            else:
+                self._root = self._push_tail(shift, self._root, tail)
+            self._tail = [val]
+        self._cnt = cnt + 1
+        return self
+
+    def assoc(self, i, val):
+        if self._owned is None: _retired("assoc!")
+        if i == self._cnt: return self.conj(val)
+        if not 0 <= i < self._cnt: raise MalException("assoc!: index out of range")
+        tailoff = self._tailoff()
+        if i >= tailoff:
+            self._tail[i - tailoff] = val
+            return self
+        node = self._root = self._own(self._root)
+        for level in range(self._shift, 0, -5):
+            idx = (i >> level) & 31
+            node[idx] = self._own(node[idx])
+            node = node[idx]
+        node[i & 31] = val
+        return self
+
+    def pop(self):
+        if self._owned is None: _retired("pop!")
+        cnt = self._cnt
+        if cnt == 0: raise MalException("pop!: empty vector")
+        if cnt == 1 or cnt - self._tailoff() > 1:
+            self._tail.pop()
+        else:
+            self._tail = self._own(self._leaf_for(cnt - 2))
+            root = self._pop_tail(self._shift, self._root)
+            if root is None: root = []
+            if self._shift > 5 and len(root) == 1:
+                root = root[0]
+                self._shift -= 5
+            self._root = root
+        self._cnt = cnt - 1
+        return self
+
+    def persistent(self):
+        if self._owned is None: _retired("persistent!")
+        self._owned = None
+        vec = Vector.__new__(Vector)
+        vec._cnt, vec._shift, vec._root, vec._tail = self._cnt, self._shift, self._root, self._tail
+        return vec
+
+    def nth(self, i):
+        if i >= self._tailoff(): return self._tail[i & 31]
+        return self._leaf_for(i)[i & 31]
+
+    def get(self, i, default=None):
+        if type(i) is int and 0 <= i < self._cnt: return self.nth(i)
+        return default
+
+    def __getitem__(self, i):
+        if i < 0: i += self._cnt
+        if i >= self._cnt or i < 0: return None
+        return self.nth(i)
+
+    def __len__(self): return self._cnt
+
+    def __iter__(self):
+        tailoff = self._tailoff()
+        for i in range(0, tailoff, 32):
+            for val in self._leaf_for(i): yield val
+        for val in self._tail[:self._cnt - tailoff]: yield val
+
+class TransientHashMap(object):
+    __slots__ = ('_root', '_count', '_next', '_owned')
+    def __init__(self, hm):
+        self._root, self._count, self._next = hm._root, hm._count, hm._next
+        self._owned = set()
+
+    def assoc(self, key, val):
+        if self._owned is None: _retired("assoc!")
+        added = [False]
+        self._root = self._root.assoc_t(_hash32(key), 0, key, val, self._next,
+                                        added, self._owned)
+        self._count += added[0]
+        self._next += added[0]
+        return self
+
+    def dissoc(self, key):
+        if self._owned is None: _retired("dissoc!")
+        removed = [False]
+        root = self._root.dissoc_t(_hash32(key), 0, key, removed, self._owned)
+        self._root = _EMPTY_NODE if root is None else root
+        self._count -= removed[0]
+        return self
+
+    # a [key value] pair, or every entry of a map
+    def conj(self, entry):
+        if _hash_map_Q(entry):
+            for k, v in entry.items(): self.assoc(k, v)
+            return self
+        return self.assoc(entry[0], entry[1])
+
+    def persistent(self):
+        if self._owned is None: _retired("persistent!")
+        self._owned = None
+        hm = Hash_Map.__new__(Hash_Map)
+        hm._root, hm._count, hm._next = self._root, self._count, self._next
+        return hm
+
+    def get(self, key, default=None):
+        return self._root.get(_hash32(key), 0, key, default)
+
+    def __contains__(self, key):
+        return self._root.get(_hash32(key), 0, key, _MISSING) is not _MISSING
+
+    def __len__(self): return self._count
+
+    def items(self): return _ordered_items(self._root)
+
+# lazy sequences
+#
+# A LazySeq is computed on first use by a thunk returning any seqable:
+# nil, a list, a vector or another LazySeq (nested LazySeqs are
+# unwrapped iteratively, not recursively). Once realized it is a view
+# chunk[off:] of a Python list followed by the seq `more`; a cons cell
+# is a one-element chunk. Sequences drawn from a Python iterator are
+# realized a 32-element chunk at a time, and iterating over a chunk
+# does not allocate a cell per element.
+class LazySeq(object):
+    __slots__ = ('_fn', '_chunk', '_off', '_more', '_hash', '__meta__')
+    __hash__ = _seq_hash
+    def __eq__(self, other): return _equal_Q(self, other)
+    def __ne__(self, other): return not _equal_Q(self, other)
+    def __init__(self, fn):
+        self._fn, self._chunk = fn, None
+
+    def _seq(self):
+        if self._fn is None: return self._chunk
+        pending, s = [], self
+        while type(s) == LazySeq and s._fn is not None:
+            pending.append(s)
+            s = s._fn()
+        if type(s) == LazySeq:
+            chunk, off, more = s._chunk, s._off, s._more
+        elif s is None or len(s) == 0:
+            chunk, off, more = None, 0, None
+        else:
+            if type(s) != List: s = List(s)
+            chunk, off, more = [s.first()], 0, s.rest()
+        for p in pending:
+            p._fn, p._chunk, p._off, p._more = None, chunk, off, more
+        return chunk
+
+    def cons(self, val): return _lazy_chunk_seq([val], 0, self)
+
+    def first(self):
+        if self._seq() is None: return None
+        return self._chunk[self._off]
+
+    def rest(self):
+        if self._seq() is None: return List()
+        if self._off + 1 < len(self._chunk):
+            return _lazy_chunk_seq(self._chunk, self._off + 1, self._more)
+        return self._more
+
+    # Iterating drops the reference to the head, so a consumer that
+    # holds no other reference can walk a long sequence in constant memory
+    def __iter__(self):
+        s = self
+        del self
+        while type(s) == LazySeq:
+            chunk = s._seq()
+            if chunk is None: return
+            off, s = s._off, s._more
+            for val in (chunk[off:] if off else chunk): yield val
+        for val in s: yield val
+
+    def __len__(self):
+        n = 0
+        for _ in self: n += 1
+        return n
+
+    def __bool__(self): return self._seq() is not None
+    __nonzero__ = __bool__
+
+    def __getitem__(self, i):
+        if type(i) == slice:
+            if i.stop is None and i.step is None and (i.start or 0) >= 0:
+                s = self
+                for _ in range(i.start or 0):
+                    if not s: break
+                    s = s.rest()
+                return s
+            return List(list(self)[i])
+        if i < 0: return List(self)[i]
+        for val in islice(self, i, None): return val
+        return None
+
+    def __copy__(self):
+        lst = LazySeq(lambda: self)
+        if hasattr(self, '__meta__'): lst.__meta__ = self.__meta__
+        return lst
+_seq_types = (List, Vector, LazySeq)
+
+def _lazy_seq(fn): return LazySeq(fn)
+def _lazy_seq_Q(exp): return type(exp) == LazySeq
+def _lazy_chunk_seq(chunk, off, more):
+    lst = LazySeq(None)
+    lst._chunk, lst._off, lst._more = chunk, off, more
+    return lst
+def _lazy_chunk(it):
+    chunk = list(islice(it, 32))
+    if not chunk: return None
+    more = LazySeq(lambda: _lazy_chunk(it)) if len(chunk) == 32 else List()
+    return _lazy_chunk_seq(chunk, 0, more)
+def _lazy_iter(iterable):
+    it = iter(iterable)
+    return LazySeq(lambda: _lazy_chunk(it))
+
 # atoms
 class Atom(object):
     def __init__(self, val):
@@ -140,6 +952,15 @@ class Atom(object):
 def _atom(val): return Atom(val)
 def _atom_Q(exp):   return type(exp) == Atom
 
+# reduced: a value wrapped to stop a reduce early. deref unwraps it as
+# it does an atom.
+class Reduced(object):
+    __slots__ = ('val',)
+    def __init__(self, val):
+        self.val = val
+def _reduced(val): return Reduced(val)
+def _reduced_Q(exp): return type(exp) == Reduced
+
 def py_to_mal(obj):
         if type(obj) == list:   return List(obj)
         if type(obj) == tuple:  return List(obj)
@@ -3,21 +3,21 @@ import mal_types as types
 def _escape(s):
     return s.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
 
-def _pr_str(obj, print_readably=True):
-    _r = print_readably
-    if types._list_Q(obj):
-        return "(" + " ".join(map(lambda e: _pr_str(e,_r), obj)) + ")"
-    elif types._vector_Q(obj):                                    
-        return "[" + " ".join(map(lambda e: _pr_str(e,_r), obj)) + "]"
-    elif types._hash_map_Q(obj):
-        ret = []
-        for k in obj.keys():
-            ret.extend((_pr_str(k), _pr_str(obj[k],_r)))
-        return "{" + " ".join(ret) + "}"
-    elif type(obj) in types.str_types:
-        if len(obj) > 0 and obj[0] == types._u('\u029e'):
-            return ':' + obj[1:]
-        elif print_readably:
+# *print-length* and *print-level*; stepA points this at the values
+# defined in the repl environment
+def print_limits(): return None, None
+
+_OBJ, _STR, _NEXT = range(3)
+_MISSING = object()
+_brackets = {types.List: ("(", ")"), types.LazySeq: ("(", ")"),
+             types.Vector: ("[", "]"), types.Hash_Map: ("{", "}"),
+             types.Atom: ("(atom ", ")"),
+             types.TransientVector: ("#<transient [", "]>"),
+             types.TransientHashMap: ("#<transient {", "}>")}
+
+def _pr_atom(obj, print_readably):
+    if type(obj) in types.str_types:
+        if print_readably:
             return '"' + _escape(obj) + '"'
         else:
             return obj
@@ -27,8 +27,71 @@ def _pr_str(obj, print_readably=True):
         return "true"
     elif types._false_Q(obj):
         return "false"
-    elif types._atom_Q(obj):
-        return "(atom " + _pr_str(obj.val,_r) + ")"
     else:
         return obj.__str__()
 
+# Appends the printed pieces of obj to the list out. Nested collections
+# are walked with an explicit stack of tasks rather than by recursion:
+# (_OBJ, obj, readably, depth) prints a value, (_STR, s) a literal and
+# (_NEXT, iterator, close, readably, depth, count) the rest of a
+# collection. Past `length` elements a collection prints "..." and past
+# `level` nested collections a collection prints "#".
+def _write(out, obj, print_readably=True, length=None, level=None):
+    todo = [(_OBJ, obj, print_readably, 0)]
+    while todo:
+        task = todo.pop()
+        if task[0] == _OBJ:
+            _, obj, r, depth = task
+            brackets = _brackets.get(type(obj))
+            if brackets is None:
+                out.append(_pr_atom(obj, r))
+            elif level is not None and depth >= level:
+                out.append("#")
+            else:
+                out.append(brackets[0])
+                if brackets[1][0] == "}":     items = iter(obj.items())
+                elif type(obj) == types.Atom: items = iter((obj.val,))
+                else:                         items = iter(obj)
+                todo.append((_NEXT, items, brackets[1], r, depth + 1, 0))
+        elif task[0] == _STR:
+            out.append(task[1])
+        else:
+            _, items, close, r, depth, n = task
+            is_map = close[0] == "}"
+            while True:
+                item = next(items, _MISSING)
+                if item is _MISSING:
+                    out.append(close)
+                    break
+                if n: out.append(" ")
+                if length is not None and n >= length:
+                    out.append("...")
+                    out.append(close)
+                    break
+                n += 1
+                if is_map:
+                    todo.append((_NEXT, items, close, r, depth, n))
+                    todo.append((_OBJ, item[1], r, depth))
+                    todo.append((_STR, " "))
+                    todo.append((_OBJ, item[0], True, depth))
+                    break
+                elif type(item) in _brackets:
+                    todo.append((_NEXT, items, close, r, depth, n))
+                    todo.append((_OBJ, item, r, depth))
+                    break
+                else:
+                    out.append(_pr_atom(item, r))
+    return out
+
+def _pr_str(obj, print_readably=True, limited=True):
+    length, level = print_limits() if limited else (None, None)
+    return "".join(_write([], obj, print_readably, length, level))
+
+# Prints several values separated by sep into one buffer
+def _pr_strs(objs, print_readably=True, sep=" ", limited=True):
+    length, level = print_limits() if limited else (None, None)
+    out = []
+    for i, obj in enumerate(objs):
+        if i: out.append(sep)
+        _write(out, obj, print_readably, length, level)
+    return "".join(out)
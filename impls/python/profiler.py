@@ -0,0 +1,84 @@
+import time
+
+# Profiler for (profile expr) and MAL_PROFILE (see stepA_mal.py). While
+# a Profiler is running the body of every mal function is wrapped to
+# time it; when none is running nothing is wrapped and calls cost what
+# they did before. The VM (vm.py) has no bodies to wrap and calls
+# enter and leave itself around each activation. A tail call leaves
+# its caller before the callee runs, as it does without the profiler,
+# so the callee shows up as a sibling of the caller rather than as its
+# child.
+clock = getattr(time, 'perf_counter', time.time)
+
+# the running Profiler, if any
+current = None
+
+class Profiler(object):
+    def __init__(self):
+        self.stats = {}     # name: [calls, self time, cumulative time]
+        self.stacks = {}    # "outer;...;name": self time
+        self.active = {}    # name: activations on the stack
+        self.stack = []     # [name, path, start, time spent in callees]
+        self.wrapped = []
+        self.started = clock()
+        self.elapsed = None
+
+    def enter(self, name):
+        stack = self.stack
+        path = stack[-1][1] + ';' + name if stack else name
+        stack.append([name, path, clock(), 0.0])
+        self.active[name] = self.active.get(name, 0) + 1
+
+    def wrap(self, fn, name):
+        enter, leave = self.enter, self.leave
+        inner = [fn.__body__]
+        def profiled(frame):
+            enter(name)
+            try:
+                return inner[0](frame)
+            finally:
+                leave()
+                # tiered up while running: keep timing the new body
+                if fn.__body__ is not profiled:
+                    inner[0], fn.__body__ = fn.__body__, profiled
+        fn.__body__ = profiled
+        self.wrapped.append((fn, profiled, inner))
+
+    def leave(self):
+        name, path, start, callees = self.stack.pop()
+        t = clock() - start
+        stat = self.stats.get(name)
+        if stat is None: stat = self.stats[name] = [0, 0.0, 0.0]
+        stat[0] += 1
+        stat[1] += t - callees
+        self.active[name] -= 1
+        # recursive activations are already inside the outermost one
+        if not self.active[name]: stat[2] += t
+        self.stacks[path] = self.stacks.get(path, 0.0) + t - callees
+        if self.stack: self.stack[-1][3] += t
+
+    def stop(self):
+        self.elapsed = clock() - self.started
+        for fn, profiled, inner in self.wrapped:
+            if fn.__body__ is profiled: fn.__body__ = inner[0]
+        self.wrapped = []
+
+    # functions by self time, times in milliseconds
+    def report(self, out):
+        out.write("profile: %.3f ms, %d functions\n" %
+                  (self.elapsed * 1e3, len(self.stats)))
+        out.write("%10s %12s %12s  %s\n" % ("calls", "self ms", "cum ms", "function"))
+        for name, (calls, own, cum) in sorted(self.stats.items(),
+                                              key=lambda item: -item[1][1]):
+            out.write("%10d %12.3f %12.3f  %s\n" % (calls, own * 1e3, cum * 1e3, name))
+
+    # one "outer;...;name microseconds" line per call path, the input
+    # format of flamegraph.pl
+    def collapsed(self, out):
+        for path in sorted(self.stacks):
+            out.write("%s %d\n" % (path, round(self.stacks[path] * 1e6)))
+
+    # the report to path and the collapsed stacks to path.collapsed
+    def dump(self, path):
+        with open(path, 'w') as out: self.report(out)
+        with open(path + '.collapsed', 'w') as out: self.collapsed(out)
@@ -1,47 +1,198 @@
-import re
-from mal_types import (_symbol, _keyword, _list, _vector, _hash_map, _s2u, _u)
+import hashlib, marshal, os, re, sys, zlib
+from stat import S_ISREG
+from mal_types import (_symbol, _keyword, _list, _hash_map, _s2u, _u,
+                       Symbol, Keyword, List, Vector, Hash_Map)
 
 class Blank(Exception): pass
 
+# Tokens are scanned on demand from the source string as the forms are
+# built; comments are skipped by the scanner.
+_token_re = re.compile(r"""[\s,]*(~@|[\[\]{}()'`~^@]|"(?:[\\].|[^\\"])*"?|;.*|[^\s\[\]{}()'"`@,;]+)""")
+_int_re = re.compile(r"-?[0-9]+$")
+_float_re = re.compile(r"-?[0-9][0-9.]*$")
+_string_re = re.compile(r'"(?:[\\].|[^\\"])*"')
+_constants = {"nil": None, "true": True, "false": False}
+
 class Reader():
-    def __init__(self, tokens, position=0):
-        self.tokens = tokens
+    def __init__(self, source, position=0):
+        self.source = source
         self.position = position
+        self.token = None
+
+    def scan(self):
+        while True:
+            m = _token_re.match(self.source, self.position)
+            if not m: return None
+            self.position = m.end()
+            token = m.group(1)
+            if token[0] != ';': return token
 
     def next(self):
-        self.position += 1
-        return self.tokens[self.position-1]
+        token = self.peek()
+        self.token = None
+        return token
 
     def peek(self):
-        if len(self.tokens) > self.position:
-            return self.tokens[self.position]
-        else:
-            return None
+        if self.token is None:
+            self.token = self.scan()
+        return self.token
+
+# Reads from a file a line at a time, keeping only the unread part of
+# the current form in memory. line/column track the peeked token.
+class FileReader(Reader):
+    def __init__(self, file):
+        Reader.__init__(self, '')
+        self.file = file
+        self.line, self.line_pos, self.column = 1, 0, 1
+
+    def fill(self):
+        line = self.file.readline()
+        if not line:
+            self.file = None
+            return
+        source, cut = self.source, self.source.rfind('\n', 0, self.position) + 1
+        if self.line_pos < cut:
+            self.line += source.count('\n', self.line_pos, cut)
+            self.line_pos = cut
+        self.source = source[cut:] + line
+        self.position -= cut
+        self.line_pos -= cut
+
+    def scan(self):
+        while True:
+            m = _token_re.match(self.source, self.position)
+            # a token touching the end of the buffer may continue on
+            # the next line
+            if self.file is not None and (not m or m.end() == len(self.source)):
+                self.fill()
+                continue
+            if not m: return None
+            self.position = m.end()
+            token, start = m.group(1), m.start(1)
+            if token[0] == ';': continue
+            self.line += self.source.count('\n', self.line_pos, start)
+            self.line_pos = start
+            self.column = start - self.source.rfind('\n', 0, start)
+            return token
+
+def read_forms(file, name):
+    reader = FileReader(file)
+    while True:
+        if reader.peek() is None: return
+        position = (reader.line, reader.column)
+        try:
+            form = read_form(reader)
+        except Exception as exc:
+            exc.position = "%s:%d:%d" % ((name,) + position)
+            raise
+        yield position, form
+
+# The forms read from a file are cached in cache_dir, under a name
+# keyed by the file's absolute path, and reused while the file's size
+# and mtime, or failing that its crc32, are unchanged. cache_dir is
+# python_FORM_CACHE if set, where an empty value turns the cache off,
+# else mal-python in $XDG_CACHE_HOME or ~/.cache. The forms are stored
+# with marshal as nested tuples tagged by collection type. Files bigger
+# than cache_limit are only streamed.
+cache_limit = 1 << 20
+cache_dir = os.environ.get('python_FORM_CACHE', os.path.join(
+    os.environ.get('XDG_CACHE_HOME') or os.path.expanduser('~/.cache'),
+    'mal-python'))
+_cache_tag = "mal-forms-3-%d" % marshal.version
+_LIST, _VECTOR, _HASH_MAP, _SYMBOL, _KEYWORD = range(5)
+
+def _cache_path(path):
+    path = os.path.abspath(path)
+    key = path if isinstance(path, bytes) else path.encode('utf-8')
+    return os.path.join(cache_dir, "%s-%s.py%d.cache" % (
+        os.path.basename(path), hashlib.md5(key).hexdigest()[:16],
+        sys.version_info[0]))
+
+def _checksum(path):
+    crc = 0
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(65536), b''): crc = zlib.crc32(block, crc)
+    return crc & 0xffffffff
+
+def _freeze(ast):
+    t = type(ast)
+    if t == List:       return (_LIST,) + tuple(_freeze(a) for a in ast)
+    elif t == Vector:   return (_VECTOR,) + tuple(_freeze(a) for a in ast)
+    elif t == Hash_Map:
+        return (_HASH_MAP,) + tuple(_freeze(a) for kv in ast.items() for a in kv)
+    elif t == Symbol:   return (_SYMBOL, str(ast))
+    elif t == Keyword:  return (_KEYWORD, ast.name)
+    else:               return ast
+
+def _thaw(obj):
+    if type(obj) != tuple: return obj
+    tag = obj[0]
+    if tag == _SYMBOL:  return _symbol(obj[1])
+    if tag == _KEYWORD: return _keyword(obj[1])
+    vals = [_thaw(a) for a in obj[1:]]
+    if tag == _LIST:    return List(vals)
+    elif tag == _VECTOR:return Vector(vals)
+    else:               return _hash_map(*vals)
+
+def _cache_load(path, cpath, st):
+    try:
+        with open(cpath, 'rb') as f:
+            tag, mtime, size, crc, forms = marshal.loads(f.read())
+        if tag != _cache_tag or size != st.st_size: return None
+        if mtime != st.st_mtime and crc != _checksum(path): return None
+        return [(position, _thaw(form)) for position, form in forms]
+    except Exception:
+        return None
+
+def _cache_store(cpath, st, crc, forms):
+    tmp = "%s.%d" % (cpath, os.getpid())
+    try:
+        if not os.path.isdir(cache_dir): os.makedirs(cache_dir)
+        with open(tmp, 'wb') as f:
+            marshal.dump((_cache_tag, st.st_mtime, st.st_size, crc, forms), f)
+        os.rename(tmp, cpath)
+    except (IOError, OSError, ValueError):
+        pass
+
+def load_forms(path):
+    st = os.stat(path)
+    cached = cache_dir and S_ISREG(st.st_mode)
+    cpath = _cache_path(path) if cached else None
+    forms = _cache_load(path, cpath, st) if cached else None
+    if forms is not None:
+        for item in forms: yield item
+        return
+    if not cached or st.st_size > cache_limit:
+        forms, crc = None, None
+    else:
+        forms, crc = [], _checksum(path)
+    with open(path) as f:
+        for position, form in read_forms(f, path):
+            if forms is not None: forms.append((position, _freeze(form)))
+            yield position, form
+    if forms is not None: _cache_store(cpath, st, crc, forms)
 
 def tokenize(str):
-    tre = re.compile(r"""[\s,]*(~@|[\[\]{}()'`~^@]|"(?:[\\].|[^\\"])*"?|;.*|[^\s\[\]{}()'"`@,;]+)""");
-    return [t for t in re.findall(tre, str) if t[0] != ';']
+    return [t for t in _token_re.findall(str) if t[0] != ';']
 
 def _unescape(s):
     return s.replace('\\\\', _u('\u029e')).replace('\\"', '"').replace('\\n', '\n').replace(_u('\u029e'), '\\')
 
 def read_atom(reader):
-    int_re = re.compile(r"-?[0-9]+$")
-    float_re = re.compile(r"-?[0-9][0-9.]*$")
-    string_re = re.compile(r'"(?:[\\].|[^\\"])*"')
     token = reader.next()
-    if re.match(int_re, token):     return int(token)
-    elif re.match(float_re, token): return int(token)
-    elif re.match(string_re, token):return _s2u(_unescape(token[1:-1]))
-    elif token[0] == '"':           raise Exception("expected '\"', got EOF")
-    elif token[0] == ':':           return _keyword(token[1:])
-    elif token == "nil":            return None
-    elif token == "true":           return True
-    elif token == "false":          return False
+    c = token[0]
+    if c == '"':
+        if _string_re.match(token): return _s2u(_unescape(token[1:-1]))
+        else:                       raise Exception("expected '\"', got EOF")
+    elif c == ':':                  return _keyword(token[1:])
+    elif c.isdigit() or c == '-':
+        if _int_re.match(token):    return int(token)
+        elif _float_re.match(token):return int(token)
+    if token in _constants:         return _constants[token]
     else:                           return _symbol(token)
 
 def read_sequence(reader, typ=list, start='(', end=')'):
-    ast = typ()
+    ast = []
     token = reader.next()
     if token != start: raise Exception("expected '" + start + "'")
 
@@ -51,25 +202,22 @@ def read_sequence(reader, typ=list, start='(', end=')'):
         ast.append(read_form(reader))
         token = reader.peek()
     reader.next()
-    return ast
+    return typ(ast)
 
 def read_hash_map(reader):
     lst = read_sequence(reader, list, '{', '}')
     return _hash_map(*lst)
 
 def read_list(reader):
-    return read_sequence(reader, _list, '(', ')')
+    return read_sequence(reader, List, '(', ')')
 
 def read_vector(reader):
-    return read_sequence(reader, _vector, '[', ']')
+    return read_sequence(reader, Vector, '[', ']')
 
 def read_form(reader):
     token = reader.peek()
     # reader macros/transforms
-    if token[0] == ';':
-        reader.next()
-        return None
-    elif token == '\'':
+    if token == '\'':
         reader.next()
         return _list(_symbol('quote'), read_form(reader))
     elif token == '`':
@@ -105,6 +253,6 @@ def read_form(reader):
     else:              return read_atom(reader);
 
 def read_str(str):
-    tokens = tokenize(str)
-    if len(tokens) == 0: raise Blank("Blank Line")
-    return read_form(Reader(tokens))
+    reader = Reader(str)
+    if reader.peek() is None: raise Blank("Blank Line")
+    return read_form(reader)
@@ -1,172 +1,676 @@
-import functools
-import sys, traceback
+import os, re, sys
 import mal_readline
 import mal_types as types
 import reader, printer
-from env import Env
+from env import Env, Scope, with_snapshot, global_cache_stats
 import core
+from macros import quasiquote, is_macro_call, macroexpand
 
 # read
 def READ(str):
     return reader.read_str(str)
 
 # eval
-def qq_loop(acc, elt):
-    if types._list_Q(elt) and len(elt) == 2 and elt[0] == u'splice-unquote':
-        return types._list(types._symbol(u'concat'), elt[1], acc)
+# analyze: compile an AST once into a tree of closures taking a frame.
+# Locals are resolved to (depth, slot) addresses in list-backed frames
+# (see env.Scope); only globals are looked up by name, in the Env the
+# form was analyzed against. Closures analyzed in tail position may
+# return a TailCall instead of a value; the function wrappers run
+# those to completion (TCO).
+class TailCall(object):
+    __slots__ = ('f', 'args')
+    def __init__(self, f, args):
+        self.f, self.args = f, args
+
+def _function(body, ast, env, params, scope, tier=None):
+    names = scope.names
+    if '&' in params: fixed = len(params) - 2
+    else:             fixed = len(params)
+    variadic = fixed != len(params)
+    def gen_env(args):
+        frame = [env]
+        if len(args) == fixed and not variadic:
+            frame.extend(args)
+        else:
+            frame.extend(args[:fixed])
+            frame.extend([None] * (fixed + 1 - len(frame)))
+            if variadic: frame.append(types.List(args[fixed:]))
+        if len(frame) <= len(names):
+            frame.extend([None] * (len(names) + 1 - len(frame)))
+        return frame
+    def fn(*args):
+        ret = fn.__body__(gen_env(args))
+        while type(ret) is TailCall:
+            f = ret.f
+            ret = f.__body__(f.__gen_env__(ret.args))
+        return ret
+    fn.__meta__ = None
+    fn.__ast__ = ast
+    fn.__body__ = body
+    fn.__gen_env__ = gen_env
+    fn.__tier__ = tier
+    if tier and tier.factory is not False and tier_threshold > 0:
+        calls = [tier_threshold]
+        def counting(frame):
+            calls[0] -= 1
+            if calls[0] <= 0: fn.__body__ = tier_up(tier, fn, env) or body
+            return body(frame)
+        fn.__body__ = counting
+    if profiling: profiling.wrap(fn, _profile_name(fn))
+    return fn
+
+def _setter(key, env, scope):
+    if scope is None:
+        return lambda frame, val: env.set(key, val)
+    slot = scope.define(key)
+    def set_local(frame, val):
+        if slot >= len(frame):
+            frame.extend([None] * (slot + 1 - len(frame)))
+        frame[slot] = val
+        return val
+    return set_local
+
+def analyze_def(ast, env, scope, tail):
+    a1 = ast[1]
+    # a new local is not visible to its initializer; rebinding a
+    # parameter or let* binding reads the existing one
+    new = scope is not None and a1 not in scope.names
+    store = _setter(a1, env, scope)
+    if new: scope.pending.add(a1)
+    if types._list_Q(ast[2]) and len(ast[2]) > 2 and ast[2][0] == 'fn*':
+        a2 = analyze_fn(ast[2], env, scope, False, a1)
     else:
-        return types._list(types._symbol(u'cons'), quasiquote(elt), acc)
+        a2 = analyze(ast[2], env, scope)
+    if new: scope.pending.discard(a1)
+    return lambda frame: store(frame, a2(frame))
+
+def analyze_let(ast, env, scope, tail):
+    a1, bindings = ast[1], []
+    scope = Scope(scope)
+    for key in a1[0::2]: scope.define(key)
+    scope.pending.update(a1[0::2])
+    for i in range(0, len(a1), 2):
+        slot = scope.define(a1[i])
+        bindings.append((slot, analyze(a1[i+1], env, scope)))
+        scope.pending.discard(a1[i])
+    body = analyze(ast[2], env, scope, tail)
+    pad = [None] * len(scope.names)
+    def let(frame):
+        let_frame = [frame] + pad
+        for slot, node in bindings:
+            let_frame[slot] = node(let_frame)
+        return body(let_frame)
+    return let
+
+def analyze_quote(ast, env, scope, tail):
+    a1 = ast[1]
+    return lambda frame: a1
+
+def analyze_quasiquoteexpand(ast, env, scope, tail):
+    a1 = quasiquote(ast[1])
+    return lambda frame: a1
+
+def analyze_quasiquote(ast, env, scope, tail):
+    return analyze(quasiquote(ast[1]), env, scope, tail)
 
-def qq_foldr(seq):
-    return functools.reduce(qq_loop, reversed(seq), types._list())
+def analyze_defmacro(ast, env, scope, tail):
+    a1 = ast[1]
+    store = _setter(a1, env, scope)
+    a2 = analyze(ast[2], env, scope)
+    def defmacro(frame):
+        func = types._clone(a2(frame))
+        func._ismacro_ = True
+        return store(frame, func)
+    return defmacro
 
-def quasiquote(ast):
-    if types._list_Q(ast):
-        if len(ast) == 2 and ast[0] == u'unquote':
-            return ast[1]
+def analyze_macroexpand(ast, env, scope, tail):
+    a1 = ast[1]
+    return lambda frame: macroexpand(a1, env)
+
+def analyze_py_exec(ast, env, scope, tail):
+    code = compile(ast[1], '', 'single')
+    def py_exec(frame):
+        exec(code, globals())
+        return None
+    return py_exec
+
+def analyze_py_eval(ast, env, scope, tail):
+    a1 = ast[1]
+    return lambda frame: types.py_to_mal(eval(a1))
+
+def analyze_py_call(ast, env, scope, tail):
+    a1, args = ast[1], [analyze(a, env, scope) for a in ast[2:]]
+    return lambda frame: eval(a1)(*[a(frame) for a in args])
+
+def analyze_try(ast, env, scope, tail):
+    if len(ast) < 3:
+        return analyze(ast[1], env, scope, tail)
+    a1, a2 = analyze(ast[1], env, scope), ast[2]
+    if a2[0] != "catch*":
+        return a1
+    handler = analyze(a2[2], env, Scope(scope, [a2[1]]), tail)
+    def try_(frame):
+        try:
+            return a1(frame)
+        except types.MalException as exc:
+            err = exc.object
+        except Exception as exc:
+            err = exc.args[0]
+        return handler([frame, err])
+    return try_
+
+def analyze_profile(ast, env, scope, tail):
+    a1 = analyze(ast[1], env, scope)
+    a2 = analyze(ast[2], env, scope) if len(ast) > 2 else None
+    return lambda frame: profile(lambda: a1(frame), a2 and (lambda: a2(frame)))
+
+def analyze_do(ast, env, scope, tail):
+    if len(ast) < 2:
+        return lambda frame: None
+    body = [analyze(a, env, scope) for a in ast[1:-1]]
+    last = analyze(ast[-1], env, scope, tail)
+    def do(frame):
+        for node in body:
+            node(frame)
+        return last(frame)
+    return do
+
+def analyze_if(ast, env, scope, tail):
+    a1 = analyze(ast[1], env, scope)
+    a2 = analyze(ast[2], env, scope, tail)
+    if len(ast) > 3: a3 = analyze(ast[3], env, scope, tail)
+    else:            a3 = lambda frame: None
+    def if_(frame):
+        cond = a1(frame)
+        if cond is None or cond is False:
+            return a3(frame)
         else:
-            return qq_foldr(ast)
-    elif types._hash_map_Q(ast) or types._symbol_Q(ast):
-        return types._list(types._symbol(u'quote'), ast)
-    elif types._vector_Q (ast):
-        return types._list(types._symbol(u'vec'), qq_foldr(ast))
-    else:
-        return ast
+            return a2(frame)
+    return if_
 
-def is_macro_call(ast, env):
-    return (types._list_Q(ast) and
-            types._symbol_Q(ast[0]) and
-            env.find(ast[0]) and
-            hasattr(env.get(ast[0]), '_ismacro_'))
+def analyze_fn(ast, env, scope, tail, name=None):
+    a1, a2 = ast[1], ast[2]
+    scope = Scope(scope, [p for p in a1 if p != '&'], fn=True)
+    body = analyze(a2, env, scope, True)
+    tier = Tier(name or 'fn*', a1, a2, scope, env)
+    return lambda frame: _function(body, a2, frame, a1, scope, tier)
 
-def macroexpand(ast, env):
-    while is_macro_call(ast, env):
-        mac = env.get(ast[0])
-        ast = mac(*ast[1:])
-    return ast
+special_forms = {
+        'def!': analyze_def,
+        'let*': analyze_let,
+        'quote': analyze_quote,
+        'quasiquoteexpand': analyze_quasiquoteexpand,
+        'quasiquote': analyze_quasiquote,
+        'defmacro!': analyze_defmacro,
+        'macroexpand': analyze_macroexpand,
+        'py!*': analyze_py_exec,
+        'py*': analyze_py_eval,
+        '.': analyze_py_call,
+        'try*': analyze_try,
+        'profile': analyze_profile,
+        'do': analyze_do,
+        'if': analyze_if,
+        'fn*': analyze_fn}
 
-def eval_ast(ast, env):
+# Global lookups are cached per call site, keyed on env.version which
+# every def!/defmacro! (any Env.set) bumps; see env.global_cache_stats
+def analyze_global(ast, env):
+    cache = [-1, None]
+    def glob(frame):
+        if cache[0] == env.version:
+            global_cache_stats[0] += 1
+            return cache[1]
+        global_cache_stats[1] += 1
+        cache[1] = env.get(ast)
+        cache[0] = env.version
+        return cache[1]
+    return glob
+
+def analyze_symbol(ast, env, scope):
+    addr = scope.lookup(ast) if scope else None
+    if addr is None:
+        return analyze_global(ast, env)
+    depth, slot = addr
+    if depth == 0:
+        return lambda frame: frame[slot]
+    elif depth == 1:
+        return lambda frame: frame[0][slot]
+    elif depth == 2:
+        return lambda frame: frame[0][0][slot]
+    def local(frame):
+        for i in range(depth):
+            frame = frame[0]
+        return frame[slot]
+    return local
+
+def analyze_call(ast, env, scope, tail):
+    f = analyze(ast[0], env, scope)
+    args = [analyze(a, env, scope) for a in ast[1:]]
+    if tail:
+        if len(args) == 1:
+            a1, = args
+            argv = lambda frame: (a1(frame),)
+        elif len(args) == 2:
+            a1, a2 = args
+            argv = lambda frame: (a1(frame), a2(frame))
+        else:
+            argv = lambda frame: [a(frame) for a in args]
+        def call(frame):
+            fn = f(frame)
+            el = argv(frame)
+            if hasattr(fn, '__body__'):
+                return TailCall(fn, el)
+            return fn(*el)
+        return call
+    elif len(args) == 0:
+        return lambda frame: f(frame)()
+    elif len(args) == 1:
+        a1, = args
+        return lambda frame: f(frame)(a1(frame))
+    elif len(args) == 2:
+        a1, a2 = args
+        return lambda frame: f(frame)(a1(frame), a2(frame))
+    else:
+        return lambda frame: f(frame)(*[a(frame) for a in args])
+
+# A call whose head is not bound yet (a forward reference, or a macro
+# defined earlier in the same 'do'): decide macro or call on first run,
+# seeing the locals that were visible here.
+def analyze_deferred(ast, env, scope, tail):
+    impl, snap = [], scope.snapshot() if scope else []
+    def resolve():
+        if is_macro_call(ast, env):
+            return analyze(macroexpand(ast, env), env, scope, tail)
+        return analyze_call(ast, env, scope, tail)
+    def deferred(frame):
+        if not impl: impl.append(with_snapshot(snap, resolve))
+        return impl[0](frame)
+    return deferred
+
+def analyze(ast, env, scope=None, tail=False):
     if types._symbol_Q(ast):
-        return env.get(ast)
+        return analyze_symbol(ast, env, scope)
     elif types._list_Q(ast):
-        return types._list(*map(lambda a: EVAL(a, env), ast))
+        if len(ast) == 0: return lambda frame: ast
+        a0 = ast[0]
+        if types._symbol_Q(a0):
+            if a0 in special_forms:
+                return special_forms[a0](ast, env, scope, tail)
+            if not scope or scope.lookup(a0) is None:
+                if not env.find(a0):
+                    return analyze_deferred(ast, env, scope, tail)
+                if is_macro_call(ast, env):
+                    return analyze(macroexpand(ast, env), env, scope, tail)
+        return analyze_call(ast, env, scope, tail)
     elif types._vector_Q(ast):
-        return types._vector(*map(lambda a: EVAL(a, env), ast))
+        nodes = [analyze(a, env, scope) for a in ast]
+        return lambda frame: types._vector(*[n(frame) for n in nodes])
     elif types._hash_map_Q(ast):
-        return types.Hash_Map((k, EVAL(v, env)) for k, v in ast.items())
+        items = [(k, analyze(v, env, scope)) for k, v in ast.items()]
+        return lambda frame: types.Hash_Map((k, n(frame)) for k, n in items)
     else:
-        return ast  # primitive value, return unchanged
+        return lambda frame: ast  # primitive value, return unchanged
 
-def EVAL(ast, env):
-    while True:
-        #print("EVAL %s" % printer._pr_str(ast))
-        if not types._list_Q(ast):
-            return eval_ast(ast, env)
-
-        # apply list
-        ast = macroexpand(ast, env)
-        if not types._list_Q(ast):
-            return eval_ast(ast, env)
-        if len(ast) == 0: return ast
+# tier-up: a fn* instance called tier_threshold times switches to a
+# Python translation of its body, generated and compiled once per fn*
+# form. The translation reads the same frames as the closures, keeps
+# let* bindings in Python locals, turns tail calls of a def!'d function
+# to itself into a loop and inlines arithmetic on the core functions.
+# A body using anything else (fn*, def!, try*, py*, ...) stays on the
+# closures. Outcomes are kept in tier_events, and also written to
+# stderr when python_TIER_LOG is set.
+tier_threshold = int(os.environ.get('python_TIER_THRESHOLD', 100))
+tier_log = os.environ.get('python_TIER_LOG')
+tier_events = []
+
+_inline_ops = {'+': 'add', '-': 'sub', '*': 'mul',
+               '<': 'lt', '<=': 'le', '>': 'gt', '>=': 'ge'}
+_simple_re = re.compile(r"^(?:[pvtk][0-9]+|-?[0-9]+|None|True|False)$")
+
+class Tier(object):
+    __slots__ = ('name', 'params', 'ast', 'scope', 'env', 'factory')
+    def __init__(self, name, params, ast, scope, env):
+        self.name, self.params, self.ast = name, params, ast
+        self.scope, self.env = scope, env
+        self.factory = None   # None: not tried yet, False: unsupported
+
+class Unsupported(Exception): pass
+
+class Transpiler(object):
+    def __init__(self, tier):
+        self.tier, self.env = tier, tier.env
+        self.lines, self.consts, self.cells = [], [], []
+        self.ntemps = 0
+        params = [p for p in tier.params if p != '&']
+        self.args = ['p%d' % i for i in range(len(params))]
+        self.loop = '&' not in tier.params and tier.name != 'fn*'
+        self.locals = [dict(zip(params, self.args))]
+
+    def emit(self, ind, line):
+        self.lines.append('    ' * ind + line)
+
+    def temp(self):
+        self.ntemps += 1
+        return 't%d' % self.ntemps
+
+    def const(self, val):
+        if val is None or type(val) in (bool, int): return repr(val)
+        self.consts.append(val)
+        return 'k%d' % (len(self.consts) - 1)
+
+    def cell(self, key):
+        self.cells.append([-1, None, key])
+        return 'c%d' % (len(self.cells) - 1)
+
+    def simple(self, expr, ind):
+        if _simple_re.match(expr): return expr
+        t = self.temp()
+        self.emit(ind, '%s = %s' % (t, expr))
+        return t
+
+    def is_local(self, key):
+        return (any(key in names for names in self.locals) or
+                self.tier.scope.lookup(key) is not None)
+
+    def symbol(self, key):
+        for names in reversed(self.locals):
+            if key in names: return names[key]
+        addr = self.tier.scope.lookup(key)
+        if addr is None:
+            c = self.cell(key)
+            return '(%s[1] if %s[0] == env.version else _glob(%s))' % (c, c, c)
+        depth, slot = addr
+        if depth == 0: raise Unsupported('def! of %s' % key)
+        return 'outer' + '[0]' * (depth - 1) + '[%d]' % slot
+
+    # Expressions are evaluated left to right: when a later one needs
+    # statements, the earlier ones are first saved in temps.
+    def operands(self, asts, ind):
+        exprs = []
+        for a in asts:
+            mark = len(self.lines)
+            expr = self.expr(a, ind)
+            if len(self.lines) > mark:
+                spill = []
+                for i, prev in enumerate(exprs):
+                    if not _simple_re.match(prev):
+                        t = self.temp()
+                        spill.append('    ' * ind + '%s = %s' % (t, prev))
+                        exprs[i] = t
+                self.lines[mark:mark] = spill
+            exprs.append(expr)
+        return exprs
+
+    # the special form or macro at the head of ast, if any
+    def head(self, ast):
+        if len(ast) == 0 or not types._symbol_Q(ast[0]): return None
+        a0 = ast[0]
+        if a0 in ('if', 'do', 'let*', 'quote', 'quasiquote', 'quasiquoteexpand'):
+            return a0
+        if a0 in special_forms: raise Unsupported(a0)
+        if self.is_local(a0): return None
+        if not self.env.find(a0): raise Unsupported('unbound %s' % a0)
+        if is_macro_call(ast, self.env): return 'macro'
+        return None
+
+    def inline_op(self, ast):
         a0 = ast[0]
+        if (len(ast) == 3 and types._symbol_Q(a0) and a0 in _inline_ops and
+                not self.is_local(a0) and
+                self.env.find(a0).data[a0] is core.ns[a0]):
+            return _inline_ops[a0]
+        return None
+
+    def call(self, ast, ind):
+        op = self.inline_op(ast)
+        if op:
+            c = self.cell(ast[0])
+            a, b = self.operands(ast[1:], ind)
+            return ('(%s %s %s if %s[0] == env.version and %s[1] is op_%s'
+                    ' else _glob(%s)(%s, %s))' % (a, ast[0], b, c, c, op, c, a, b))
+        exprs = self.operands(ast, ind)
+        return '%s(%s)' % (exprs[0], ', '.join(exprs[1:]))
 
-        if "def!" == a0:
-            a1, a2 = ast[1], ast[2]
-            res = EVAL(a2, env)
-            return env.set(a1, res)
-        elif "let*" == a0:
-            a1, a2 = ast[1], ast[2]
-            let_env = Env(env)
-            for i in range(0, len(a1), 2):
-                let_env.set(a1[i], EVAL(a1[i+1], let_env))
-            ast = a2
-            env = let_env
-            # Continue loop (TCO)
-        elif "quote" == a0:
-            return ast[1]
-        elif "quasiquoteexpand" == a0:
-            return quasiquote(ast[1]);
-        elif "quasiquote" == a0:
-            ast = quasiquote(ast[1]);
-            # Continue loop (TCO)
-        elif 'defmacro!' == a0:
-            func = types._clone(EVAL(ast[2], env))
-            func._ismacro_ = True
-            return env.set(ast[1], func)
-        elif 'macroexpand' == a0:
-            return macroexpand(ast[1], env)
-        elif "py!*" == a0:
-            exec(compile(ast[1], '', 'single'), globals())
-            return None
-        elif "py*" == a0:
-            return types.py_to_mal(eval(ast[1]))
-        elif "." == a0:
-            el = eval_ast(ast[2:], env)
-            f = eval(ast[1])
-            return f(*el)
-        elif "try*" == a0:
-            if len(ast) < 3:
-                return EVAL(ast[1], env)
-            a1, a2 = ast[1], ast[2]
-            if a2[0] == "catch*":
-                err = None
-                try:
-                    return EVAL(a1, env)
-                except types.MalException as exc:
-                    err = exc.object
-                except Exception as exc:
-                    err = exc.args[0]
-                catch_env = Env(env, [a2[1]], [err])
-                return EVAL(a2[2], catch_env)
-            else:
-                return EVAL(a1, env);
-        elif "do" == a0:
-            eval_ast(ast[1:-1], env)
-            ast = ast[-1]
-            # Continue loop (TCO)
-        elif "if" == a0:
-            a1, a2 = ast[1], ast[2]
-            cond = EVAL(a1, env)
-            if cond is None or cond is False:
-                if len(ast) > 3: ast = ast[3]
-                else:            ast = None
-            else:
-                ast = a2
-            # Continue loop (TCO)
-        elif "fn*" == a0:
-            a1, a2 = ast[1], ast[2]
-            return types._function(EVAL, Env, a2, env, a1)
+    def let(self, ast, ind):
+        names, a1 = {}, ast[1]
+        self.locals.append(names)
+        for i in range(0, len(a1), 2):
+            expr = self.expr(a1[i+1], ind)
+            self.ntemps += 1
+            var = 'v%d' % self.ntemps
+            self.emit(ind, '%s = %s' % (var, expr))
+            names[a1[i]] = var
+
+    def branch(self, ast, ind):
+        cond = self.simple(self.expr(ast[1], ind), ind)
+        self.emit(ind, 'if %s is None or %s is False:' % (cond, cond))
+        return ast[3] if len(ast) > 3 else None
+
+    def expr(self, ast, ind):
+        if types._symbol_Q(ast):
+            return self.symbol(ast)
+        elif types._vector_Q(ast):
+            return 'types._vector(%s)' % ', '.join(self.operands(ast, ind))
+        elif types._hash_map_Q(ast):
+            keys = [self.const(k) for k in ast.keys()]
+            vals = self.operands(ast.values(), ind)
+            return 'types._hash_map(%s)' % ', '.join(
+                    '%s, %s' % kv for kv in zip(keys, vals))
+        elif not types._list_Q(ast):
+            return self.const(ast)
+        head = self.head(ast)
+        if head is None:
+            return self.call(ast, ind) if len(ast) else self.const(ast)
+        elif head == 'macro':
+            return self.expr(macroexpand(ast, self.env), ind)
+        elif head == 'quote':
+            return self.const(ast[1])
+        elif head == 'quasiquoteexpand':
+            return self.const(quasiquote(ast[1]))
+        elif head == 'quasiquote':
+            return self.expr(quasiquote(ast[1]), ind)
+        elif head == 'do':
+            for a in ast[1:-1]:
+                expr = self.expr(a, ind)
+                if not _simple_re.match(expr): self.emit(ind, expr)
+            return self.expr(ast[-1], ind) if len(ast) > 1 else 'None'
+        elif head == 'let*':
+            self.let(ast, ind)
+            expr = self.simple(self.expr(ast[2], ind), ind)
+            self.locals.pop()
+            return expr
+        else:
+            t = self.temp()
+            other = self.branch(ast, ind)
+            self.emit(ind + 1, '%s = %s' % (t, self.expr(other, ind + 1)))
+            self.emit(ind, 'else:')
+            self.emit(ind + 1, '%s = %s' % (t, self.expr(ast[2], ind + 1)))
+            return t
+
+    # emits statements that return the value of ast
+    def tail(self, ast, ind):
+        head = self.head(ast) if types._list_Q(ast) else 'value'
+        if head is None and len(ast):
+            self.tail_call(ast, ind)
+        elif head == 'macro':
+            self.tail(macroexpand(ast, self.env), ind)
+        elif head == 'quasiquote':
+            self.tail(quasiquote(ast[1]), ind)
+        elif head == 'do' and len(ast) > 1:
+            for a in ast[1:-1]:
+                expr = self.expr(a, ind)
+                if not _simple_re.match(expr): self.emit(ind, expr)
+            self.tail(ast[-1], ind)
+        elif head == 'let*':
+            self.let(ast, ind)
+            self.tail(ast[2], ind)
+            self.locals.pop()
+        elif head == 'if':
+            other = self.branch(ast, ind)
+            self.tail(other, ind + 1)
+            self.emit(ind, 'else:')
+            self.tail(ast[2], ind + 1)
         else:
-            el = eval_ast(ast, env)
-            f = el[0]
-            if hasattr(f, '__ast__'):
-                ast = f.__ast__
-                env = f.__gen_env__(el[1:])
-            else:
-                return f(*el[1:])
+            self.emit(ind, 'return %s' % self.expr(ast, ind))
+
+    def tail_call(self, ast, ind):
+        if self.inline_op(ast):
+            self.emit(ind, 'return %s' % self.call(ast, ind))
+            return
+        exprs = self.operands(ast, ind)
+        f = self.simple(exprs[0], ind)
+        args = [self.simple(e, ind) for e in exprs[1:]]
+        if self.loop and ast[0] == self.tier.name and len(args) == len(self.args):
+            self.emit(ind, 'if %s is SELF and SELF.__body__ is body:' % f)
+            if args:
+                self.emit(ind + 1, '%s = %s' % (', '.join(self.args), ', '.join(args)))
+            self.emit(ind + 1, 'continue')
+        argv = ', '.join(args) + (',' if len(args) == 1 else '')
+        self.emit(ind, "if hasattr(%s, '__body__'): return TailCall(%s, (%s))" % (f, f, argv))
+        self.emit(ind, 'return %s(%s)' % (f, ', '.join(args)))
+
+    def source(self):
+        self.tail(self.tier.ast, 3)
+        src = ['def make(SELF, outer, env, K, C):',
+               '    def _glob(cell):',
+               '        cell[1], cell[0] = env.get(cell[2]), env.version',
+               '        return cell[1]']
+        src.extend('    k%d = K[%d]' % (i, i) for i in range(len(self.consts)))
+        src.extend('    c%d = C[%d]' % (i, i) for i in range(len(self.cells)))
+        src.append('    def body(frame):')
+        src.extend('        %s = frame[%d]' % (p, i + 1) for i, p in enumerate(self.args))
+        src.append('        while True:')
+        src.extend(self.lines)
+        src.append('    return body')
+        return '\n'.join(src) + '\n'
+
+def tier_up(tier, fn, outer):
+    if tier.factory is None:
+        try:
+            tr = Transpiler(tier)
+            ns = {'TailCall': TailCall, 'types': types}
+            for op in _inline_ops: ns['op_' + _inline_ops[op]] = core.ns[op]
+            exec(compile(tr.source(), '<mal %s>' % tier.name, 'exec'), ns)
+            tier.factory = (ns['make'], tr.consts, tr.cells)
+            status = 'compiled'
+        except Unsupported as exc:
+            tier.factory = False
+            status = 'interpreted: %s' % exc.args[0]
+        tier_events.append((tier.name, status))
+        if tier_log: sys.stderr.write('tier-up %s: %s\n' % (tier.name, status))
+    if tier.factory is False: return None
+    make, consts, cells = tier.factory
+    return make(fn, outer, tier.env, consts, cells)
+
+# (profile expr) times the mal functions called while evaluating expr
+# and prints a report to stderr; (profile expr path) writes it to path
+# and the collapsed stacks to path.collapsed. MAL_PROFILE=path profiles
+# the whole run the same way. See profiler.py.
+profiling = None
+
+def _profile_name(fn):
+    return str(fn.__tier__.name) if fn.__tier__ else 'fn*'
+
+def start_profile():
+    global profiling
+    import gc, profiler
+    profiling = profiler.current = profiler.Profiler()
+    for obj in gc.get_objects():
+        if type(obj) is type(_function) and hasattr(obj, '__gen_env__'):
+            profiling.wrap(obj, _profile_name(obj))
+    return profiling
+
+def stop_profile():
+    global profiling
+    import profiler
+    profiling.stop()
+    profiling = profiler.current = None
+
+# evaluates expr() and reports on it, path() giving the file to write to
+def profile(expr, path=None):
+    if profiling: return expr()
+    prof = start_profile()
+    try:
+        ret = expr()
+    finally:
+        stop_profile()
+    if path: prof.dump(path())
+    else:    prof.report(sys.stderr)
+    return ret
+
+def EVAL(ast, env):
+    return analyze(ast, env)(env)
+
+if os.environ.get('python_ENGINE') == 'vm':
+    import vm
+    vm.profile = profile
+    EVAL = vm.EVAL
 
 # print
 def PRINT(exp):
     return printer._pr_str(exp)
 
 # repl
+# A mal call costs a few more Python frames as closures than it did
+# as a recursive EVAL; keep the same mal-level depth available.
+sys.setrecursionlimit(max(sys.getrecursionlimit(), 2500))
 repl_env = Env()
 def REP(str):
     return PRINT(EVAL(READ(str), repl_env))
 
+# Forms are evaluated as they are read; an error is tagged with the
+# position of the innermost top-level form that raised it.
+def load_file(path):
+    for position, ast in reader.load_forms(path):
+        try:
+            EVAL(ast, repl_env)
+        except Exception as exc:
+            if not hasattr(exc, 'position'):
+                exc.position = "%s:%d:%d" % ((path,) + position)
+            raise
+
+def print_error(exc):
+    if isinstance(exc, types.MalException):
+        print("Error:", printer._pr_str(exc.object))
+    else:
+        # imported here, it is slow to load and only needed on errors
+        import traceback
+        print("".join(traceback.format_exception(*sys.exc_info())))
+    if hasattr(exc, 'position'):
+        print("  at", exc.position)
+
 # core.py: defined using python
 for k, v in core.ns.items(): repl_env.set(types._symbol(k), v)
 repl_env.set(types._symbol('eval'), lambda ast: EVAL(ast, repl_env))
+repl_env.set(types._symbol('global-cache-stats'),
+             lambda: types._hash_map(types._keyword('hits'), global_cache_stats[0],
+                                     types._keyword('misses'), global_cache_stats[1]))
+repl_env.set(types._symbol('load-file'), load_file)
+repl_env.set(types._symbol('tier-events'),
+             lambda: types._list(*[types._vector(str(n), s) for n, s in tier_events]))
 repl_env.set(types._symbol('*ARGV*'), types._list(*sys.argv[2:]))
+repl_env.set(types._symbol('*print-length*'), None)
+repl_env.set(types._symbol('*print-level*'), None)
+printer.print_limits = lambda: (repl_env.get(types._symbol('*print-length*')),
+                                repl_env.get(types._symbol('*print-level*')))
 
 # core.mal: defined using the language itself
 REP("(def! *host-language* \"python\")")
 REP("(def! not (fn* (a) (if a false true)))")
-REP("(def! load-file (fn* (f) (eval (read-string (str \"(do \" (slurp f) \"\nnil)\")))))")
+REP("(defmacro! lazy-seq (fn* [& body] `(lazy-seq* (fn* [] (do ~@body)))))")
 REP("(defmacro! cond (fn* (& xs) (if (> (count xs) 0) (list 'if (first xs) (if (> (count xs) 1) (nth xs 1) (throw \"odd number of forms to cond\")) (cons 'cond (rest (rest xs)))))))")
 
+if os.environ.get('MAL_PROFILE'):
+    import atexit
+    prof = start_profile()
+    atexit.register(lambda: (stop_profile(), prof.dump(os.environ['MAL_PROFILE'])))
+
 if len(sys.argv) >= 2:
-    REP('(load-file "' + sys.argv[1] + '")')
+    try:
+        load_file(sys.argv[1])
+    except Exception as e:
+        print_error(e)
+        sys.exit(1)
     sys.exit(0)
 
 # repl loop
@@ -178,7 +682,5 @@ while True:
         if line == "": continue
         print(REP(line))
     except reader.Blank: continue
-    except types.MalException as e:
-        print("Error:", printer._pr_str(e.object))
     except Exception as e:
-        print("".join(traceback.format_exception(*sys.exc_info())))
+        print_error(e)
@@ -0,0 +1,549 @@
+from types import FunctionType
+import mal_types as types
+from env import Scope, with_snapshot, global_cache_stats
+import core
+import profiler
+from macros import quasiquote, is_macro_call, macroexpand
+
+# Bytecode engine for stepA, selected with python_ENGINE=vm (see ./run).
+#
+# A form is compiled once into a Code object: a flat list of (opcode,
+# argument) pairs and a constant pool, run by the dispatch loop in
+# run(). Locals live in list frames addressed by (depth, slot) as in
+# the closure compiler (see env.Scope). A call from one compiled
+# function to another pushes a VM frame instead of recursing in Python
+# and TAIL_CALL replaces the current one. apply and the host functions
+# in _host below call back into mal the same way, so non-tail recursion
+# is bounded by memory rather than by the Python stack; other calls
+# through Python (lazy seqs, macro expansion) start a nested run().
+
+(LOCAL, GLOBAL, CONST, CALL, TAIL_CALL, RETURN, JUMP_IF_FALSE, JUMP,
+ OUTER, DEEP, POP, SET_LOCAL, SET_GLOBAL, CLOSURE, LET, UNLET, TRY,
+ END_TRY, VECTOR, HASH_MAP, MACRO, MACROEXPAND, DEFERRED, PY_EXEC,
+ PY_EVAL, PY_CALL, PROFILE) = range(27)
+
+class Code(object):
+    __slots__ = ('ops', 'consts', 'env')
+    def __init__(self, env):
+        self.ops, self.consts, self.env = [], [], env
+
+    # returns the position of the argument, for patching jumps
+    def emit(self, op, arg=0):
+        self.ops.append(op)
+        self.ops.append(arg)
+        return len(self.ops) - 1
+
+    def const(self, val):
+        self.consts.append(val)
+        return len(self.consts) - 1
+
+    def patch(self, pos):
+        self.ops[pos] = len(self.ops)
+
+class Template(object):
+    __slots__ = ('code', 'params', 'fixed', 'variadic', 'scope', 'ast', 'name')
+    def __init__(self, code, params, scope, ast, name='fn*'):
+        self.code, self.params, self.scope, self.ast = code, params, scope, ast
+        self.name = name
+        if '&' in params: self.fixed = len(params) - 2
+        else:             self.fixed = len(params)
+        self.variadic = self.fixed != len(params)
+
+class Closure(object):
+    def __init__(self, tmpl, env):
+        self.tmpl, self.env = tmpl, env
+        self.__meta__ = None
+        self.__ast__ = tmpl.ast
+
+    def __call__(self, *args):
+        return run(self.tmpl.code, _frame(self.tmpl, self.env, args), self.tmpl.name)
+
+    def __str__(self): return "#<function>"
+
+def _frame(tmpl, env, args):
+    frame = [env]
+    if len(args) == tmpl.fixed and not tmpl.variadic:
+        frame.extend(args)
+    else:
+        frame.extend(args[:tmpl.fixed])
+        frame.extend([None] * (tmpl.fixed + 1 - len(frame)))
+        if tmpl.variadic: frame.append(types.List(args[tmpl.fixed:]))
+    pad = len(tmpl.scope.names) + 1 - len(frame)
+    if pad > 0: frame.extend([None] * pad)
+    return frame
+
+# compile: emit code for ast into code. A form compiled in tail
+# position leaves through RETURN or TAIL_CALL; any other form leaves
+# its value on the stack.
+def _value(code, tail):
+    if tail: code.emit(RETURN)
+
+def _store(key, code, scope):
+    if scope is None: code.emit(SET_GLOBAL, code.const(key))
+    else:             code.emit(SET_LOCAL, scope.define(key))
+
+def compile_def(ast, code, scope, tail):
+    a1 = ast[1]
+    # as in stepA, only a new local is hidden from its initializer
+    new = scope is not None and a1 not in scope.names
+    if new:
+        scope.define(a1)
+        scope.pending.add(a1)
+    if types._list_Q(ast[2]) and len(ast[2]) > 2 and ast[2][0] == 'fn*':
+        compile_fn(ast[2], code, scope, False, a1)
+    else:
+        compile_form(ast[2], code, scope)
+    if new: scope.pending.discard(a1)
+    _store(a1, code, scope)
+    _value(code, tail)
+
+def compile_let(ast, code, scope, tail):
+    a1 = ast[1]
+    scope = Scope(scope)
+    for key in a1[0::2]: scope.define(key)
+    scope.pending.update(a1[0::2])
+    size = code.emit(LET)
+    for i in range(0, len(a1), 2):
+        compile_form(a1[i+1], code, scope)
+        scope.pending.discard(a1[i])
+        code.emit(SET_LOCAL, scope.define(a1[i]))
+        code.emit(POP)
+    code.ops[size] = len(scope.names)
+    compile_form(ast[2], code, scope, tail)
+    if not tail: code.emit(UNLET)
+
+def compile_quote(ast, code, scope, tail):
+    code.emit(CONST, code.const(ast[1]))
+    _value(code, tail)
+
+def compile_quasiquoteexpand(ast, code, scope, tail):
+    code.emit(CONST, code.const(quasiquote(ast[1])))
+    _value(code, tail)
+
+def compile_quasiquote(ast, code, scope, tail):
+    compile_form(quasiquote(ast[1]), code, scope, tail)
+
+def compile_defmacro(ast, code, scope, tail):
+    compile_form(ast[2], code, scope)
+    code.emit(MACRO)
+    _store(ast[1], code, scope)
+    _value(code, tail)
+
+def compile_macroexpand(ast, code, scope, tail):
+    code.emit(MACROEXPAND, code.const(ast[1]))
+    _value(code, tail)
+
+def compile_py_exec(ast, code, scope, tail):
+    code.emit(PY_EXEC, code.const(compile(ast[1], '', 'single')))
+    _value(code, tail)
+
+def compile_py_eval(ast, code, scope, tail):
+    code.emit(PY_EVAL, code.const(ast[1]))
+    _value(code, tail)
+
+def compile_py_call(ast, code, scope, tail):
+    for a in ast[2:]: compile_form(a, code, scope)
+    code.emit(PY_CALL, code.const((ast[1], len(ast) - 2)))
+    _value(code, tail)
+
+def compile_try(ast, code, scope, tail):
+    if len(ast) < 3 or ast[2][0] != "catch*":
+        return compile_form(ast[1], code, scope, tail)
+    a2 = ast[2]
+    handler = code.emit(TRY)
+    compile_form(ast[1], code, scope)
+    code.emit(END_TRY)
+    if tail: code.emit(RETURN)
+    else:    end = code.emit(JUMP)
+    code.patch(handler)
+    # the handler starts with the error on the stack
+    scope = Scope(scope, [a2[1]])
+    code.emit(LET, 1)
+    code.emit(SET_LOCAL, 1)
+    code.emit(POP)
+    compile_form(a2[2], code, scope, tail)
+    if not tail:
+        code.emit(UNLET)
+        code.patch(end)
+
+def compile_do(ast, code, scope, tail):
+    if len(ast) < 2:
+        code.emit(CONST, code.const(None))
+        return _value(code, tail)
+    for a in ast[1:-1]:
+        compile_form(a, code, scope)
+        code.emit(POP)
+    compile_form(ast[-1], code, scope, tail)
+
+def compile_if(ast, code, scope, tail):
+    compile_form(ast[1], code, scope)
+    else_ = code.emit(JUMP_IF_FALSE)
+    compile_form(ast[2], code, scope, tail)
+    if not tail: end = code.emit(JUMP)
+    code.patch(else_)
+    if len(ast) > 3:
+        compile_form(ast[3], code, scope, tail)
+    else:
+        code.emit(CONST, code.const(None))
+        _value(code, tail)
+    if not tail: code.patch(end)
+
+def compile_fn(ast, code, scope, tail, name='fn*'):
+    a1, a2 = ast[1], ast[2]
+    scope = Scope(scope, [p for p in a1 if p != '&'], fn=True)
+    body = Code(code.env)
+    compile_form(a2, body, scope, True)
+    code.emit(CLOSURE, code.const(Template(body, a1, scope, a2, name)))
+    _value(code, tail)
+
+# expr (and path) are compiled apart, to be run in the current frame
+# by the profile function stepA points this at
+profile = None
+
+def compile_profile(ast, code, scope, tail):
+    parts = []
+    for a in ast[1:3]:
+        part = Code(code.env)
+        compile_form(a, part, scope, True)
+        parts.append(part)
+    code.emit(PROFILE, code.const(parts))
+    _value(code, tail)
+
+special_forms = {
+        'def!': compile_def,
+        'let*': compile_let,
+        'quote': compile_quote,
+        'quasiquoteexpand': compile_quasiquoteexpand,
+        'quasiquote': compile_quasiquote,
+        'defmacro!': compile_defmacro,
+        'macroexpand': compile_macroexpand,
+        'py!*': compile_py_exec,
+        'py*': compile_py_eval,
+        '.': compile_py_call,
+        'try*': compile_try,
+        'profile': compile_profile,
+        'do': compile_do,
+        'if': compile_if,
+        'fn*': compile_fn}
+
+def compile_symbol(ast, code, scope):
+    addr = scope.lookup(ast) if scope else None
+    if addr is None:
+        # global lookups are cached per site in [env.version, value, key]
+        code.emit(GLOBAL, code.const([-1, None, ast]))
+        return
+    depth, slot = addr
+    if depth == 0:   code.emit(LOCAL, slot)
+    elif depth == 1: code.emit(OUTER, slot)
+    else:            code.emit(DEEP, code.const(addr))
+
+def compile_call(ast, code, scope, tail):
+    for a in ast: compile_form(a, code, scope)
+    code.emit(TAIL_CALL if tail else CALL, len(ast) - 1)
+
+def compile_form(ast, code, scope=None, tail=False):
+    if types._symbol_Q(ast):
+        compile_symbol(ast, code, scope)
+    elif types._list_Q(ast):
+        if len(ast) == 0:
+            code.emit(CONST, code.const(ast))
+            return _value(code, tail)
+        a0 = ast[0]
+        if types._symbol_Q(a0):
+            if a0 in special_forms:
+                return special_forms[a0](ast, code, scope, tail)
+            if not scope or scope.lookup(a0) is None:
+                # not bound yet: decide macro or call on first run
+                if not code.env.find(a0):
+                    snap = scope.snapshot() if scope else []
+                    code.emit(DEFERRED, code.const([ast, scope, tail, None, snap]))
+                    return
+                if is_macro_call(ast, code.env):
+                    return compile_form(macroexpand(ast, code.env), code, scope, tail)
+        return compile_call(ast, code, scope, tail)
+    elif types._vector_Q(ast):
+        for a in ast: compile_form(a, code, scope)
+        code.emit(VECTOR, len(ast))
+    elif types._hash_map_Q(ast):
+        for k, v in ast.items():
+            code.emit(CONST, code.const(k))
+            compile_form(v, code, scope)
+        code.emit(HASH_MAP, len(ast))
+    else:
+        code.emit(CONST, code.const(ast))
+    _value(code, tail)
+
+# compiled on first run against the locals visible where it was
+# deferred, as in stepA
+def _deferred(cell, env):
+    ast, scope, tail, sub, snap = cell
+    if sub is None:
+        sub = Code(env)
+        def resolve():
+            if is_macro_call(ast, env):
+                compile_form(macroexpand(ast, env), sub, scope, True)
+            else:
+                compile_call(ast, sub, scope, True)
+        with_snapshot(snap, resolve)
+        cell[3] = sub
+    return sub
+
+# Host functions that call mal functions, as generators run by the VM:
+# each `yield f, args` calls f and resumes with its result, and the
+# final `yield _DONE, value` returns value. They mirror core.py.
+_DONE = object()
+
+def _map(f, lst=core._missing):
+    if lst is core._missing or types._nil_Q(lst) or types._lazy_seq_Q(lst):
+        yield _DONE, core.mapf(f, lst)
+        return
+    out = []
+    for x in lst: out.append((yield f, (x,)))
+    yield _DONE, types.List(out)
+
+def _filter(f, lst=core._missing):
+    if lst is core._missing or types._nil_Q(lst) or types._lazy_seq_Q(lst):
+        yield _DONE, core.filterf(f, lst)
+        return
+    out = []
+    for x in lst:
+        if core._truthy((yield f, (x,))): out.append(x)
+    yield _DONE, types.List(out)
+
+def _swap(atm, f, *args):
+    atm.val = yield f, (atm.val,) + args
+    yield _DONE, atm.val
+
+_host = {core.mapf: _map, core.filterf: _filter, core.swap_BANG: _swap}
+
+# Resumes the host generator gen with ret, running it (and the ones
+# suspended below it once it is done) until it calls a mal function or
+# a compiled caller is reached. Returns the VM state to continue with,
+# or (None, 0, None, value) once calls is empty.
+def _resume(gen, ret, calls, prof=None):
+    while True:
+        f, args = gen.send(ret)
+        while f is not _DONE and type(f) is not Closure:
+            f, args = gen.send(f(*args))
+        if f is not _DONE:
+            calls.append(gen)
+            if prof: prof.enter(f.tmpl.name, len(calls))
+            return f.tmpl.code, 0, _frame(f.tmpl, f.env, args), []
+        ret = args
+        if not calls: return None, 0, None, ret
+        gen = calls.pop()
+        if prof: prof.leave(len(calls))
+        if type(gen) is tuple:
+            gen[3].append(ret)
+            return gen
+
+# Returns ret to the caller on top of calls
+def _return(ret, calls, prof=None):
+    if not calls: return None, 0, None, ret
+    top = calls.pop()
+    if prof: prof.leave(len(calls))
+    if type(top) is tuple:
+        top[3].append(ret)
+        return top
+    return _resume(top, ret, calls, prof)
+
+# Times the activations of one run() for the running profiler. An
+# activation runs while len(calls) is its depth, and is over once
+# calls is popped below that (or the tail call it makes starts).
+class _Activations(object):
+    def __init__(self, prof):
+        self.prof, self.depths = prof, []
+
+    def enter(self, name, depth):
+        self.prof.enter(name)
+        self.depths.append(depth)
+
+    def leave(self, depth):
+        depths = self.depths
+        while depths and depths[-1] > depth:
+            depths.pop()
+            self.prof.leave()
+
+    def tail_call(self, name, depth):
+        if self.depths and self.depths[-1] == depth:
+            self.depths.pop()
+            self.prof.leave()
+        self.enter(name, depth)
+
+# run: the dispatch loop, for a function called name or for a form.
+# calls holds the suspended callers, as (code, pc, frame, stack) or as
+# host generators; handlers the active try* blocks as (len(calls),
+# code, handler pc, frame, stack, depth). prof is only set while the
+# profiler runs.
+def run(code, frame, name=None):
+    if not profiler.current: return _run(code, frame, None)
+    prof = _Activations(profiler.current)
+    if name: prof.enter(name, 0)
+    try:
+        return _run(code, frame, prof)
+    finally:
+        prof.leave(-1)
+
+def _run(code, frame, prof):
+    ops, consts, env = code.ops, code.consts, code.env
+    pc, stack, calls, handlers = 0, [], [], []
+    stats = global_cache_stats
+    while True:
+        try:
+            while True:
+                op, arg = ops[pc], ops[pc+1]
+                pc += 2
+                if op == LOCAL:
+                    stack.append(frame[arg])
+                elif op == GLOBAL:
+                    cell = consts[arg]
+                    if cell[0] != env.version:
+                        stats[1] += 1
+                        cell[1] = env.get(cell[2])
+                        cell[0] = env.version
+                    else:
+                        stats[0] += 1
+                    stack.append(cell[1])
+                elif op == CONST:
+                    stack.append(consts[arg])
+                elif op == CALL:
+                    if arg == 2:
+                        a2 = stack.pop()
+                        args = (stack.pop(), a2)
+                    elif arg == 1:
+                        args = (stack.pop(),)
+                    else:
+                        n = len(stack) - arg
+                        args = stack[n:]
+                        del stack[n:]
+                    f = stack.pop()
+                    if f is core.apply:
+                        f, args = args[0], list(args[1:-1]) + list(args[-1])
+                    if type(f) is Closure:
+                        calls.append((code, pc, frame, stack))
+                        code, tmpl = f.tmpl.code, f.tmpl
+                        ops, consts, env = code.ops, code.consts, code.env
+                        pc, frame, stack = 0, _frame(tmpl, f.env, args), []
+                        if prof: prof.enter(tmpl.name, len(calls))
+                    elif type(f) is FunctionType and f in _host:
+                        calls.append((code, pc, frame, stack))
+                        code, pc, frame, stack = _resume(_host[f](*args), None, calls, prof)
+                        if code is None: return stack
+                        ops, consts, env = code.ops, code.consts, code.env
+                    else:
+                        stack.append(f(*args))
+                elif op == TAIL_CALL:
+                    n = len(stack) - arg
+                    args = stack[n:]
+                    del stack[n:]
+                    f = stack.pop()
+                    if f is core.apply:
+                        f, args = args[0], list(args[1:-1]) + list(args[-1])
+                    if type(f) is Closure:
+                        code, tmpl = f.tmpl.code, f.tmpl
+                        ops, consts, env = code.ops, code.consts, code.env
+                        pc, frame, stack = 0, _frame(tmpl, f.env, args), []
+                        if prof: prof.tail_call(tmpl.name, len(calls))
+                    else:
+                        if type(f) is FunctionType and f in _host:
+                            code, pc, frame, stack = _resume(_host[f](*args), None, calls, prof)
+                        else:
+                            code, pc, frame, stack = _return(f(*args), calls, prof)
+                        if code is None: return stack
+                        ops, consts, env = code.ops, code.consts, code.env
+                elif op == RETURN:
+                    ret = stack.pop()
+                    if not calls: return ret
+                    top = calls.pop()
+                    if prof: prof.leave(len(calls))
+                    if type(top) is tuple:
+                        code, pc, frame, stack = top
+                        stack.append(ret)
+                    else:
+                        code, pc, frame, stack = _resume(top, ret, calls, prof)
+                        if code is None: return stack
+                    ops, consts, env = code.ops, code.consts, code.env
+                elif op == JUMP_IF_FALSE:
+                    cond = stack.pop()
+                    if cond is None or cond is False: pc = arg
+                elif op == JUMP:
+                    pc = arg
+                elif op == OUTER:
+                    stack.append(frame[0][arg])
+                elif op == DEEP:
+                    depth, slot = consts[arg]
+                    outer = frame
+                    for i in range(depth): outer = outer[0]
+                    stack.append(outer[slot])
+                elif op == POP:
+                    stack.pop()
+                elif op == SET_LOCAL:
+                    if arg >= len(frame): frame.extend([None] * (arg + 1 - len(frame)))
+                    frame[arg] = stack[-1]
+                elif op == SET_GLOBAL:
+                    env.set(consts[arg], stack[-1])
+                elif op == CLOSURE:
+                    stack.append(Closure(consts[arg], frame))
+                elif op == LET:
+                    frame = [frame] + [None] * arg
+                elif op == UNLET:
+                    frame = frame[0]
+                elif op == TRY:
+                    handlers.append((len(calls), code, arg, frame, stack, len(stack)))
+                elif op == END_TRY:
+                    handlers.pop()
+                elif op == VECTOR:
+                    n = len(stack) - arg
+                    vals = stack[n:]
+                    del stack[n:]
+                    stack.append(types.Vector(vals))
+                elif op == HASH_MAP:
+                    n = len(stack) - 2 * arg
+                    vals = stack[n:]
+                    del stack[n:]
+                    stack.append(types.Hash_Map(zip(vals[0::2], vals[1::2])))
+                elif op == MACRO:
+                    f = types._clone(stack.pop())
+                    f._ismacro_ = True
+                    stack.append(f)
+                elif op == MACROEXPAND:
+                    stack.append(macroexpand(consts[arg], env))
+                elif op == DEFERRED:
+                    cell = consts[arg]
+                    sub = _deferred(cell, env)
+                    if not cell[2]: calls.append((code, pc, frame, stack))
+                    code = sub
+                    ops, consts, env = code.ops, code.consts, code.env
+                    pc, stack = 0, []
+                elif op == PY_EXEC:
+                    exec(consts[arg], globals())
+                    stack.append(None)
+                elif op == PY_EVAL:
+                    stack.append(types.py_to_mal(eval(consts[arg])))
+                elif op == PY_CALL:
+                    name, count = consts[arg]
+                    n = len(stack) - count
+                    args = stack[n:]
+                    del stack[n:]
+                    stack.append(eval(name)(*args))
+                elif op == PROFILE:
+                    parts = consts[arg]
+                    stack.append(profile(
+                        lambda: run(parts[0], frame),
+                        len(parts) > 1 and (lambda: run(parts[1], frame))))
+                else:
+                    raise Exception("bad opcode %d" % op)
+        except Exception as exc:
+            if not handlers: raise
+            depth, code, pc, frame, stack, n = handlers.pop()
+            del calls[depth:]
+            if prof: prof.leave(depth)
+            del stack[n:]
+            ops, consts, env = code.ops, code.consts, code.env
+            if isinstance(exc, types.MalException): stack.append(exc.object)
+            else:                                   stack.append(exc.args[0])
+
+def EVAL(ast, env):
+    code = Code(env)
+    compile_form(ast, code, None, True)
+    return run(code, env)